@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Micro-benchmark comparing the linear AUR package lookup with the hashed name index of
+AURAdapter"""
+
+import json
+import os
+import sys
+import timeit
+import urllib.parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers.aur import AURAdapter  # noqa: E402
+from helpers.http import HTTPResponse  # noqa: E402
+
+
+class StaticHTTPClient():
+    """Answers multiinfo requests from the given AUR results"""
+
+    def __init__(self, results):
+        self.index = {pkg['Name']: pkg for pkg in results}
+
+    def get(self, url, headers=None):
+        names = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query).get('arg[]', list())
+        results = [self.index[name] for name in names if name in self.index]
+        return HTTPResponse(url, 200, dict(), json.dumps(
+            {'type': 'multiinfo', 'resultcount': len(results), 'results': results}).encode())
+
+
+def make_results(count):
+    return [{'Name': 'ros-noetic-pkg-%i' % i, 'Version': '1.0.%i-1' % i, 'Maintainer': 'someone'}
+            for i in range(count)]
+
+
+def linear_lookup(results, names):
+    found = dict()
+    for name in names:
+        for pkg in results:
+            if pkg['Name'] == name:
+                found[name] = pkg
+                break
+    return found
+
+
+def linear_missing(results, names):
+    return {name for name in names if not any(pkg['Name'] == name for pkg in results)}
+
+
+def main():
+    count = 10000
+    results = make_results(count)
+    # every second package is missing in AUR
+    names = ['ros-noetic-pkg-%i' % i for i in range(0, 2 * count, 2)]
+
+    adapter = AURAdapter('noetic', StaticHTTPClient(results),
+                         [pkg['Name'] for pkg in results] + names)
+    assert set(linear_lookup(results, names)) == set(adapter.get_package_infos(names))
+    assert linear_missing(results, names) == adapter.get_missing_names(names)
+
+    print('%i AUR results, %i lookups' % (count, len(names)))
+    for title, linear_func, indexed_func in [
+            ('lookup', lambda: linear_lookup(results, names),
+             lambda: adapter.get_package_infos(names)),
+            ('missing', lambda: linear_missing(results, names),
+             lambda: adapter.get_missing_names(names))]:
+        linear = min(timeit.repeat(linear_func, number=1, repeat=3))
+        indexed = min(timeit.repeat(indexed_func, number=1, repeat=3))
+        print('%s\n  linear scan:  %8.4f s\n  hashed index: %8.4f s\n  speedup:      %8.1fx'
+              % (title, linear, indexed, linear / indexed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""End-to-end benchmark of check_distro.py on synthetic fixture bundles.
+
+For every size a fixture bundle with that many packages is generated and check_distro.py is run in
+replay mode against it. Wall time, peak RSS and per package throughput are reported. The results
+can be stored as baseline and later runs compared against it, failing if they regress by more
+than the given tolerance."""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+from helpers.aur import AURAdapter  # noqa: E402
+from helpers.checker import aur_pkg_name_from_name  # noqa: E402
+from helpers.fixtures import FixtureBundle  # noqa: E402
+from helpers.github import GHAdapter  # noqa: E402
+
+DISTRO_NAME = 'noetic'
+
+
+def generate_bundle(path, count, seed=0, queried_names=None):
+    """Generate a fixture bundle with ``count`` packages. Most packages are in AUR and on Github,
+    some are outdated, out of sync or installed. The AUR responses are recorded for runs with
+    --aur-query info checking the ``queried_names``, which defaults to all packages."""
+    rng = random.Random(seed)
+    bundle = FixtureBundle(path)
+    pkg_names = ['pkg_%i' % i for i in range(count)]
+    versions = {pkg_name: '1.%i.%i' % (rng.randrange(10), rng.randrange(10))
+                for pkg_name in pkg_names}
+    bundle.store_rosdistro(DISTRO_NAME, pkg_names, versions)
+
+    gh_adapter = GHAdapter(DISTRO_NAME)
+    aur_results = list()
+    installed = dict()
+    for pkg_name in pkg_names:
+        aur_pkg_name = aur_pkg_name_from_name(pkg_name, DISTRO_NAME)
+        version = versions[pkg_name]
+        if rng.random() < 0.1:
+            # missing in AUR and on Github
+            continue
+        if rng.random() < 0.2:
+            version = '0.%i.0' % rng.randrange(10)
+        aur_results.append({'Name': aur_pkg_name, 'Version': '%s-1' % version,
+                            'Maintainer': 'maintainer%i' % rng.randrange(20),
+                            'LastModified': 1600000000})
+        gh_version = version if rng.random() < 0.9 else versions[pkg_name]
+        bundle.store_response('/'.join([gh_adapter.repo_base_url, aur_pkg_name, 'master/PKGBUILD']),
+                              200, dict(),
+                              ("pkgname='%s'\npkgver='%s'\npkgrel=1\n" % (aur_pkg_name, gh_version)
+                               ).encode('utf-8'))
+        if rng.random() < 0.1:
+            installed[aur_pkg_name] = '%s-1' % version
+    bundle.store_pacman(installed)
+
+    # AURweb caps search results, so large distributions are resolved with multiinfo requests
+    aur_index = {pkg['Name']: pkg for pkg in aur_results}
+    if queried_names is None:
+        queried_names = pkg_names
+    for url in AURAdapter.get_info_urls(aur_pkg_name_from_name(pkg_name, DISTRO_NAME)
+                                        for pkg_name in queried_names):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        results = [aur_index[name] for name in query['arg[]'] if name in aur_index]
+        bundle.store_response(url, 200, dict(),
+                              json.dumps({'type': 'multiinfo', 'resultcount': len(results),
+                                          'results': results}).encode('utf-8'))
+
+
+def run_check_distro(bundle_path, latency, jobs):
+    """Run check_distro.py in replay mode. Returns the wall time and the peak RSS in KiB."""
+    cmd = [sys.executable, os.path.join(REPO_DIR, 'check_distro.py'),
+           '--distro_name', DISTRO_NAME, '--replay', bundle_path,
+           '--replay-latency', str(latency), '--jobs', str(jobs), '--aur-query', 'info']
+    start = time.perf_counter()
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, rusage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError('%s failed with exit code %i' % (' '.join(cmd), process.returncode))
+    return wall, rusage.ru_maxrss
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=str, default='1000,5000,20000',
+                        help='Comma separated numbers of packages. Defaults to 1000,5000,20000')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Simulated latency per request in seconds. Defaults to 0')
+    parser.add_argument('--jobs', type=int, default=8,
+                        help='Passed to check_distro.py. Defaults to 8')
+    parser.add_argument('--save-baseline', dest='save_baseline', type=str, default=None,
+                        help='Store the results as baseline in this file')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare the results against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative regression against the baseline. Defaults to 0.2')
+    args = parser.parse_args()
+
+    results = dict()
+    print('%8s %10s %12s %14s' % ('packages', 'wall [s]', 'peak RSS [MiB]', 'packages/s'))
+    for size in [int(size) for size in args.sizes.split(',')]:
+        with tempfile.TemporaryDirectory() as bundle_path:
+            generate_bundle(bundle_path, size)
+            wall, rss = run_check_distro(bundle_path, args.latency, args.jobs)
+        results[str(size)] = {'wall': wall, 'rss': rss}
+        print('%8i %10.2f %12.1f %14.0f' % (size, wall, rss / 1024.0, size / wall))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = list()
+        for size, result in results.items():
+            if size not in baseline:
+                continue
+            for metric in ('wall', 'rss'):
+                if result[metric] > baseline[size][metric] * (1 + args.tolerance):
+                    regressions.append('%s packages: %s %.2f > baseline %.2f'
+                                       % (size, metric, result[metric], baseline[size][metric]))
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
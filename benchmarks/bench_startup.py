@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark of the startup time of check_distro.py.
+
+Reports the import time of check_distro measured with ``python -X importtime`` and which of the
+heavy modules got imported, together with the wall time of ``--help`` and of a targeted query
+for a single package replayed from a synthetic fixture bundle. As with bench_check_distro.py the
+results can be stored as baseline and compared against it."""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_check_distro import DISTRO_NAME, REPO_DIR, generate_bundle
+
+# Modules that should only be imported once they are actually needed
+HEAVY_MODULES = ('rosdistro', 'catkin_pkg', 'yaml', 'http.client', 'http.server', 'cProfile')
+
+
+def measure_imports():
+    """Returns the cumulative import time of check_distro in seconds, the cumulative time of each
+    module it imports directly and the heavy modules that were imported"""
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import check_distro'],
+                            cwd=REPO_DIR, stderr=subprocess.PIPE, check=True,
+                            universal_newlines=True).stderr
+    total = 0.0
+    direct = dict()
+    modules = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules.add(name.strip())
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == 'check_distro':
+            total = int(cumulative) / 1e6
+        elif depth == 1:
+            direct[name.strip()] = int(cumulative) / 1e6
+    return total, direct, [module for module in HEAVY_MODULES if module in modules]
+
+
+def measure_run(args, repeat):
+    """Returns the minimal wall time of running check_distro.py with the given arguments"""
+    cmd = [sys.executable, os.path.join(REPO_DIR, 'check_distro.py')] + args
+    walls = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        walls.append(time.perf_counter() - start)
+    return min(walls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=5000,
+                        help='Number of packages in the replayed distribution. Defaults to 5000')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of runs of which the fastest is reported. Defaults to 5')
+    parser.add_argument('--save-baseline', dest='save_baseline', type=str, default=None,
+                        help='Store the results as baseline in this file')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Compare the results against this baseline file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative regression against the baseline. Defaults to 0.2')
+    args = parser.parse_args()
+
+    imports, direct, heavy = measure_imports()
+    print('import check_distro: %8.1f ms' % (imports * 1000))
+    for name, seconds in sorted(direct.items(), key=lambda item: -item[1])[:10]:
+        print('  %-30s %8.1f ms' % (name, seconds * 1000))
+    print('heavy modules imported: %s' % (', '.join(heavy) if heavy else 'none'))
+
+    help_wall = measure_run(['--help'], args.repeat)
+    print('--help:              %8.1f ms' % (help_wall * 1000))
+    with tempfile.TemporaryDirectory() as bundle_path:
+        generate_bundle(bundle_path, args.size, queried_names=['pkg_1'])
+        query_wall = measure_run(['--distro_name', DISTRO_NAME, '--replay', bundle_path,
+                                  '--aur-query', 'info', '--packages', 'pkg_1'], args.repeat)
+    print('single package:      %8.1f ms (%i packages in the distribution)'
+          % (query_wall * 1000, args.size))
+
+    results = {'imports': imports, 'help': help_wall, 'query': query_wall}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = ['%s: %.1f ms > baseline %.1f ms'
+                       % (metric, value * 1000, baseline[metric] * 1000)
+                       for metric, value in results.items()
+                       if metric in baseline and value > baseline[metric] * (1 + args.tolerance)]
+        if regressions:
+            print('\nRegressions:\n' + '\n'.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+"""Benchmark of Version parsing and comparison throughput"""
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from helpers.package import Version  # noqa: E402
+
+
+def make_version_strings(count, seed=0):
+    rng = random.Random(seed)
+    return ['%i.%i.%i-%i' % (rng.randrange(3), rng.randrange(20), rng.randrange(100),
+                             rng.randrange(1, 4))
+            for _ in range(count)]
+
+
+def parse_unique(version_strings):
+    Version._cache.clear()
+    for version_string in version_strings:
+        Version(version_string)
+
+
+def parse_repeated(version_strings):
+    for version_string in version_strings:
+        Version(version_string)
+
+
+def main():
+    count = 20000
+    version_strings = make_version_strings(count)
+    unique_strings = ['%s.%i' % (version_string, i)
+                      for i, version_string in enumerate(version_strings)]
+
+    unique = min(timeit.repeat(lambda: parse_unique(unique_strings), number=1, repeat=3))
+    repeated = min(timeit.repeat(lambda: parse_repeated(version_strings), number=1, repeat=3))
+
+    versions = [Version(version_string) for version_string in version_strings]
+    sort = min(timeit.repeat(lambda: sorted(versions), number=1, repeat=3))
+    group = min(timeit.repeat(lambda: len(set(versions)), number=1, repeat=3))
+
+    print('%i versions' % count)
+    print('parse (unique):   %10.0f versions/s' % (count / unique))
+    print('parse (interned): %10.0f versions/s' % (count / repeated))
+    print('sort:             %10.4f s' % sort)
+    print('group (set):      %10.4f s' % group)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,129 +26,490 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import argparse
+import concurrent.futures
+import os
 import sys
-
-import catkin_pkg
+import threading
 
 from helpers.aur import AURAdapter
+from helpers.cache import CachedHTTPClient
+from helpers.checker import DistroChecker, aur_pkg_name_from_name
+from helpers.dependencies import DependencyGraph, load_dependency_graph
+from helpers.filters import PackageFilter
+from helpers.fixtures import FixtureBundle, RecordingHTTPClient, ReplayHTTPClient
+from helpers.git_mirror import GitMirrorAdapter
 from helpers.github import GHAdapter
-from helpers.rosdistro_adapter import RosdistroAdapter
-from helpers.package import Package
+from helpers.http import FetchError, HTTPClient
+from helpers.rosdistro_adapter import (RosdistroAdapter, get_index, load_version_snapshot,
+                                       store_version_snapshot)
+from helpers.pacman import PacmanDB
+from helpers.report import SINKS, MultiDistroReport, Progress
+from helpers.scheduler import RequestScheduler
+from helpers.state import StateStore, get_state_dir
+from helpers.stats import ThreadProfiler, stats
+
+
+def split_list(value):
+    """Split a comma separated command line argument. Returns None for an empty argument."""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def load_rosdistro(distro_name, index=None, with_dependencies=False, snapshot=None):
+    """Returns the package names of a ROS distribution, their released versions and, if
+    requested, the dependency graph of the distribution. If a version snapshot is given, the
+    distribution is only downloaded if manifests have to be parsed for the dependency graph."""
+    rosdistro = RosdistroAdapter(distro_name, index)
+    if snapshot:
+        pkg_names, versions = snapshot
+    else:
+        pkg_names = list(rosdistro.get_package_list())
+        versions = rosdistro.get_package_versions()
+        store_version_snapshot(distro_name, pkg_names, versions)
+    dependencies = None
+    if with_dependencies:
+        dependencies = load_dependency_graph(distro_name, versions,
+                                             rosdistro.get_package_dependencies)
+    return pkg_names, versions, dependencies
 
-def aur_pkg_name_from_name(pkg_name, distro_name):
-    return "ros-%s-%s" % (distro_name, pkg_name.replace('_', '-'))
+
+def get_snapshot_max_age(args):
+    """Returns the age in seconds up to which the version snapshot of a distribution is used
+    instead of rosdistro, or None if it mustn't be used"""
+    if args.replay or args.record or not (args.use_cache or args.offline):
+        return None
+    return float('inf') if args.offline else args.cache_ttl
+
+
+def load_snapshots(args, distro_names):
+    """Returns the version snapshot of every distribution that can be used instead of rosdistro,
+    or None. In offline mode rosdistro can't be downloaded, so every distribution needs one."""
+    max_age = get_snapshot_max_age(args)
+    snapshots = {distro_name: load_version_snapshot(distro_name, max_age)
+                 if max_age is not None else None
+                 for distro_name in distro_names}
+    missing = [distro_name for distro_name, snapshot in snapshots.items() if not snapshot]
+    if args.offline and not args.replay and missing:
+        raise FetchError('There is no snapshot of the distribution %s for --offline, run once '
+                         'without it first' % ', '.join(missing))
+    return snapshots
 
 
 def main():
     parser = argparse.ArgumentParser(
         description='A small package to get an overview of Archlinux ROS packages')
+    parser.add_argument('command', nargs='?', choices=['check', 'serve'], default='check',
+                        help='"check" prints a report once. "serve" keeps all information in '
+                        'memory, refreshes it periodically and answers queries over HTTP, e.g. '
+                        '/outdated?distro=noetic, /package/<name> or /status. Defaults to "check"')
     parser.add_argument('--distro_name', type=str,
-                        help='The ROS distribution that should be used.  Defaults to "noetic"',
+                        help='The ROS distribution that should be used. Multiple distributions can '
+                        'be given as a comma separated list.  Defaults to "noetic"',
                         default='noetic')
     parser.add_argument('--hide_outdated', dest='show_outdated', action='store_false',
                         help='Hide packages that are outdated in AUR')
     parser.add_argument('--hide_outofsync', dest='show_outofsync', action='store_false',
                         help="Hide packages where the github version doesn't match the AUR version")
     parser.add_argument('--show_installed_only', dest='show_installed', action='store_true',
-                        help='Show only outdated packages that are installed.')
+                        help='Check and show only packages that are installed.')
     parser.add_argument('--hide_missing', dest='show_missing', action='store_false',
                         help='Hide packages that are missing in AUR',
                         default=True)
     parser.add_argument('--hide_ahead', dest='show_ahead', action='store_false',
                         help='Hide packages that are ahead in AUR')
+    parser.add_argument('--hide_unchecked', dest='show_unchecked', action='store_false',
+                        help='Hide packages whose Github information could not be fetched')
+    parser.add_argument('--format', choices=['report', 'text', 'jsonl', 'csv'], default='report',
+                        help='Output format. "report" lists the packages grouped by category once '
+                        'all packages are checked. "text" (one line per package), "jsonl" (JSON '
+                        'Lines) and "csv" write every package as soon as it is checked. Defaults '
+                        'to "report"')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Write the output to this file. Defaults to stdout')
+    parser.add_argument('--sort', choices=['name', 'impact'], default='name',
+                        help='Order of the packages inside each list. "impact" sorts by the number '
+                        'of packages depending on a package directly or transitively, which needs '
+                        'the package manifests of the whole distribution. Defaults to "name"')
+    parser.add_argument('--rebuild-plan', dest='rebuild_plan', action='store_true',
+                        help='Print the outdated and missing packages and everything depending on '
+                        'them in the order they have to be rebuilt')
+    parser.add_argument('--jobs', type=int, default=8,
+                        help='Number of parallel requests used for fetching package information. '
+                        'Defaults to 8')
+    parser.add_argument('--rate-limit', dest='rate_limit', type=float, default=50.0,
+                        help='Maximum number of requests per second started per host. The number '
+                        'of parallel requests per host is additionally reduced while a host '
+                        'throttles. 0 disables the limit. Defaults to 50')
+    parser.add_argument('--retries', type=int, default=4,
+                        help='Number of retries of requests failing with a network error, a '
+                        'server error or rate limiting. Defaults to 4')
+    parser.add_argument('--pacman-db', dest='pacman_db', type=str, default=None,
+                        help='Read installed packages from this pacman database path instead of '
+                        'querying pacman, e.g. /var/lib/pacman')
+    parser.add_argument('--cache-dir', dest='cache_dir', type=str, default=None,
+                        help='Directory for caching HTTP responses. If given, the AUR metadata '
+                        'dump is kept in its aur subdirectory. Defaults to '
+                        '$XDG_CACHE_HOME/arch_ros_package_monitor/http')
+    parser.add_argument('--cache-ttl', dest='cache_ttl', type=int, default=3600,
+                        help='Seconds for which cached responses are used without revalidation. '
+                        'Defaults to 3600')
+    parser.add_argument('--cache-size', dest='cache_size', type=int, default=200,
+                        help='Maximum size of the HTTP cache in MiB. Defaults to 200')
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false',
+                        help='Do not use the HTTP cache')
+    parser.add_argument('--offline', action='store_true',
+                        help='Do not make any requests, only use cached responses')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Report packages that became outdated since the last incremental '
+                        'run. The first run only records the state. All sources are still checked, '
+                        'but PKGBUILDs are revalidated with conditional requests and only parsed '
+                        'again if they changed')
+    parser.add_argument('--state-file', dest='state_file', type=str, default=None,
+                        help='State file used by --incremental. Defaults to '
+                        '$XDG_STATE_HOME/arch_ros_package_monitor/<distro_name>.json')
+    parser.add_argument('--aur-query', dest='aur_query', choices=['search', 'info', 'dump'],
+                        default='search',
+                        help='How packages are looked up in AUR. "search" does a single search for '
+                        'the distro prefix, which AUR caps on large distros. "info" resolves every '
+                        'package of the distribution with batched multiinfo requests. "dump" reads '
+                        'the AUR metadata dump, which is only downloaded if it changed. '
+                        'Defaults to "search"')
+    parser.add_argument('--gh-backend', dest='gh_backend', choices=['http', 'git'], default='http',
+                        help='How PKGBUILDs are read from the Github organization. "http" '
+                        'downloads each PKGBUILD, "git" keeps local mirrors of the repositories '
+                        'that are updated with incremental fetches. Defaults to "http"')
+    parser.add_argument('--git-mirror-dir', dest='git_mirror_dir', type=str, default=None,
+                        help='Directory for the git mirrors used by --gh-backend git. Defaults to '
+                        '$XDG_CACHE_HOME/arch_ros_package_monitor/git')
+    parser.add_argument('--packages', type=str, default=None,
+                        help='Only check packages whose ROS package name matches one of these '
+                        'comma separated glob patterns, e.g. "moveit_*,rviz"')
+    parser.add_argument('--packages-regex', dest='packages_regex', type=str, default=None,
+                        help='Only check packages whose ROS package name matches this regular '
+                        'expression')
+    parser.add_argument('--maintainer', type=str, default=None,
+                        help='Only check packages maintained in AUR by one of these comma '
+                        'separated users')
+    parser.add_argument('--stats', action='store_true',
+                        help='Print the time spent and requests made per stage')
+    parser.add_argument('--stats-json', dest='stats_json', type=str, default=None,
+                        help='Write the per stage statistics as JSON to this file')
+    parser.add_argument('--stats-prometheus', dest='stats_prometheus', type=str, default=None,
+                        help='Write the per stage statistics to this file in the Prometheus '
+                        'textfile collector format')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='Write a cProfile dump of the run to this file, which can be '
+                        'inspected with pstats')
+    parser.add_argument('--record', type=str, default=None,
+                        help='Record all responses of AUR, Github, rosdistro and pacman into this '
+                        'fixture directory')
+    parser.add_argument('--replay', type=str, default=None,
+                        help='Answer all requests from a fixture directory created with --record '
+                        'instead of contacting the real services')
+    parser.add_argument('--replay-latency', dest='replay_latency', type=float, default=0.0,
+                        help='Seconds every replayed request is delayed by. Defaults to 0')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                        help='Address the server listens on. Defaults to 127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080,
+                        help='Port the server listens on. Defaults to 8080')
+    parser.add_argument('--refresh-installed', dest='refresh_installed', type=int, default=60,
+                        help='Seconds between reloading the installed packages in server mode. '
+                        '0 disables the refresh. Defaults to 60')
+    parser.add_argument('--refresh-rosdistro', dest='refresh_rosdistro', type=int, default=3600,
+                        help='Seconds between reloading the rosdistro index in server mode. '
+                        'Defaults to 3600')
+    parser.add_argument('--refresh-aur', dest='refresh_aur', type=int, default=900,
+                        help='Seconds between querying AUR in server mode. Defaults to 900')
+    parser.add_argument('--refresh-github', dest='refresh_github', type=int, default=3600,
+                        help='Seconds between checking the Github PKGBUILDs in server mode. '
+                        'Defaults to 3600')
     parser.set_defaults(show_outdated=True)
     parser.set_defaults(show_outofsync=True)
     parser.set_defaults(show_installed=False)
     parser.set_defaults(show_missing=True)
     parser.set_defaults(show_ahead=True)
+    parser.set_defaults(show_unchecked=True)
 
     args = parser.parse_args()
 
-    print('Checking distro "%s". this might take a while...' % args.distro_name)
-
-    rosdistro = RosdistroAdapter(args.distro_name)
-    package_distribution_list = rosdistro.get_package_list()
-
-    aur_adapter = AURAdapter(args.distro_name)
-    gh_adapter = GHAdapter(args.distro_name)
-
-    outdated_pkgs = list()
-    outofsync_pkgs = list()
-    missing_pkgs = list()
-    error_pkgs = list()
-    ahead_pkgs = list()
-
-    for pkg_name in package_distribution_list:
-        # if pkg_name == 'capabilities':
-        # # DEBUG stop
-        # break
-        # print("---\nChecking %s" % pkg_name)
-        pkg = Package(pkg_name)
-        try:
-            pkg_info = rosdistro.get_package_by_name(pkg_name)
-            pkg.add_rosdistro_information(pkg_info)
-            aur_pkg_name = aur_pkg_name_from_name(pkg_name, args.distro_name)
-            aur_pkg = aur_adapter.get_package_info(aur_pkg_name)
-
-            # print('Upstream version: %s' % pkg_info.version)
-
-            if aur_pkg:
-                pkg.add_aur_information(aur_pkg)
-                # print('AUR version: %s' % aur_pkg['Version'])
-
-            # As querying this takes a lot of time enable it only if desired
-            if args.show_outofsync:
-                gh_pkg = gh_adapter.get_package_info(aur_pkg_name)
-                if gh_pkg:
-                    pkg.add_gh_information(gh_pkg)
-
-            if pkg.is_outdated():
-                outdated_pkgs.append(pkg)
-            if pkg.is_outofsync():
-                outofsync_pkgs.append(pkg)
-            elif pkg.is_missing():
-                missing_pkgs.append(pkg)
-            if pkg.is_ahead():
-                ahead_pkgs.append(pkg)
-
-        except TypeError as err:
-            error_pkgs.append(pkg)
-            print("Parsing error: %s\n%s" % (pkg_name, err), file=sys.stderr)
-        except catkin_pkg.package.InvalidPackage as err:
-            error_pkgs.append(pkg)
-            print("Invalid package: %s\n%s" % (pkg_name, err), file=sys.stderr)
-
-    if args.show_missing:
-        print("\nMissing packages:")
-        for pkg in missing_pkgs:
-            if args.show_installed and not pkg.is_installed():
-                # skip this package
-                continue
-            print(pkg)
-
-    if args.show_outdated:
-        print("\nOutdated packages:")
-        for pkg in outdated_pkgs:
-            if args.show_installed and not pkg.is_installed():
-                # skip this package
-                continue
-            print(pkg)
-
-    if args.show_outofsync:
-        print("\nOut of sync packages:")
-        for pkg in outofsync_pkgs:
-            if args.show_installed and not pkg.is_installed():
-                # skip this package
-                continue
-            print(pkg)
-
-    if args.show_ahead:
-        print("\nAhead packages:")
-        for pkg in ahead_pkgs:
-            if args.show_installed and not pkg.is_installed():
-                # skip this package
-                continue
-            print(pkg)
+    distro_names = split_list(args.distro_name)
+    if not distro_names:
+        parser.error('--distro_name must not be empty')
+    if args.state_file and len(distro_names) > 1:
+        parser.error('--state-file can only be used with a single distribution')
+    if args.record and args.replay:
+        parser.error('--record and --replay are mutually exclusive')
+    if args.format != 'report' and (args.sort != 'name' or args.rebuild_plan):
+        parser.error('--sort and --rebuild-plan can only be used with --format report')
+    if args.command == 'serve' and (args.record or args.incremental):
+        parser.error('--record and --incremental can not be used with serve')
+
+    profiler = None
+    if args.profile:
+        profiler = ThreadProfiler()
+        profiler.enable()
+
+    try:
+        with stats.measure('total'):
+            if args.command == 'serve':
+                serve(args)
+            else:
+                check_distros(args, profiler.wrap if profiler else None)
+    except FetchError as err:
+        print(err, file=sys.stderr)
+        sys.exit(1)
+
+    if profiler:
+        profiler.disable()
+        profiler.dump(args.profile)
+    if args.stats:
+        print("\n%s" % stats.format_table(), file=sys.stderr)
+    if args.stats_json:
+        stats.write_json(args.stats_json)
+    if args.stats_prometheus:
+        stats.write_prometheus(args.stats_prometheus)
+
+
+def load_distro(args, bundle, distro_name, index, snapshot=None):
+    """Load the package names, versions and the dependency graph of a distribution, from or into a
+    fixture bundle if requested. The dependency graph is only loaded if it is needed."""
+    with_dependencies = args.sort == 'impact' or args.rebuild_plan
+    if args.replay:
+        pkg_names, versions = bundle.load_rosdistro(distro_name)
+        dependencies = None
+        if with_dependencies:
+            dependencies = DependencyGraph.from_dependencies(
+                bundle.load_dependencies(distro_name) or dict.fromkeys(versions, list()))
+        return pkg_names, versions, dependencies
+    pkg_names, versions, dependencies = load_rosdistro(distro_name, index, with_dependencies,
+                                                       snapshot)
+    if args.record:
+        bundle.store_rosdistro(distro_name, pkg_names, versions,
+                               {pkg_name: dependencies.get_dependencies(pkg_name)
+                                for pkg_name in dependencies.names} if dependencies else None)
+    return pkg_names, versions, dependencies
+
+
+def load_installed(args, bundle):
+    """Load the installed packages, from or into a fixture bundle if requested"""
+    if args.replay:
+        return PacmanDB(packages=bundle.load_pacman())
+    pacman_db = PacmanDB(args.pacman_db)
+    if args.record:
+        bundle.store_pacman(pacman_db.packages)
+    return pacman_db
+
+
+def make_http_client(args, cache_ttl=None):
+    """Returns the HTTP client used by all adapters and the fixture bundle it records into or
+    replays from, if any"""
+    bundle = None
+    scheduler = RequestScheduler(max_concurrency=args.jobs, rate=args.rate_limit or None,
+                                 max_retries=args.retries)
+    http_client = HTTPClient(scheduler=scheduler)
+    if args.replay:
+        bundle = FixtureBundle(args.replay)
+        http_client = ReplayHTTPClient(bundle, args.replay_latency)
+    elif args.record:
+        # Don't use the cache when recording, as cache hits would be missing in the bundle
+        bundle = FixtureBundle(args.record)
+        http_client = RecordingHTTPClient(http_client, bundle)
+    elif args.use_cache or args.offline:
+        http_client = CachedHTTPClient(
+            http_client, cache_dir=args.cache_dir,
+            ttl=args.cache_ttl if cache_ttl is None else cache_ttl,
+            max_size=args.cache_size * 1024 * 1024, offline=args.offline)
+    return http_client, bundle
+
+
+def make_package_filter(args):
+    return PackageFilter(
+        patterns=split_list(args.packages), regex=args.packages_regex,
+        installed_only=args.show_installed, maintainers=split_list(args.maintainer))
+
+
+def load_aur(args, http_client, distro_names, aur_pkg_names=None):
+    """Load the AUR records of the given distributions as selected by --aur-query. The info
+    query needs the names of all packages that should be resolved."""
+    if args.aur_query == 'search':
+        return AURAdapter(distro_names, http_client)
+    if args.aur_query == 'dump':
+        # the dump is cached next to the HTTP responses
+        dump_dir = os.path.join(args.cache_dir, 'aur') if args.cache_dir else None
+        return AURAdapter(distro_names, http_client, use_dump=True, dump_dir=dump_dir)
+    return AURAdapter(distro_names, http_client, aur_pkg_names, args.jobs)
+
+
+def make_gh_adapter(args, http_client, distro_name, aur_pkg_names):
+    """Returns the adapter reading the PKGBUILDs of a distribution as selected by --gh-backend"""
+    if args.gh_backend == 'git':
+        gh_adapter = GitMirrorAdapter(distro_name, args.git_mirror_dir, offline=args.offline)
+        if args.show_outofsync:
+            # refresh all mirrors at once instead of one package at a time
+            gh_adapter.get_package_infos(aur_pkg_names, jobs=args.jobs)
+        return gh_adapter
+    return GHAdapter(distro_name, http_client)
+
+
+def check_distros(args, wrap=None):
+    """Check all distributions given on the command line and print the report. Functions run
+    inside worker threads are wrapped by ``wrap``, which is used for profiling them."""
+    if wrap is None:
+        def wrap(func):
+            return func
+
+    distro_names = split_list(args.distro_name)
+    # Keep stdout clean for the machine readable formats
+    info_stream = sys.stdout if args.format == 'report' else sys.stderr
+    print('Checking distro "%s". this might take a while...' % ', '.join(distro_names),
+          file=info_stream)
+
+    # Incremental runs have to notice new PKGBUILD commits, so cached responses are always
+    # revalidated. Unchanged responses are cheap 304s.
+    http_client, bundle = make_http_client(args, cache_ttl=0 if args.incremental else None)
+    pkg_filter = make_package_filter(args)
+
+    # Recent snapshots of the distributions make downloading the rosdistro index unnecessary
+    snapshots = load_snapshots(args, distro_names)
+
+    # The bulk sources are independent of each other, so load them concurrently. The rosdistro
+    # index, the installed packages and the AUR query are shared by all distributions. Only the
+    # multiinfo AUR query has to wait for the package names from rosdistro, so it only queries
+    # the packages surviving the local filters.
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(distro_names) + 2) as executor:
+        index_future = None
+        if not args.replay and not all(snapshots.values()):
+            index_future = executor.submit(wrap(get_index))
+        pacman_future = executor.submit(wrap(load_installed), args, bundle)
+        if args.aur_query != 'info':
+            aur_future = executor.submit(wrap(load_aur), args, http_client, distro_names)
+        index = index_future.result() if index_future else None
+        rosdistro_futures = {
+            distro_name: executor.submit(wrap(load_distro), args, bundle, distro_name, index,
+                                         snapshots[distro_name])
+            for distro_name in distro_names}
+        distro_versions = dict()
+        distro_dependencies = dict()
+        distro_pkg_names = dict()
+        pacman_db = pacman_future.result()
+        for distro_name, future in rosdistro_futures.items():
+            pkg_names, distro_versions[distro_name], distro_dependencies[distro_name] = \
+                future.result()
+            distro_pkg_names[distro_name] = pkg_filter.filter_local(pkg_names, distro_name,
+                                                                    pacman_db)
+        if args.aur_query == 'info':
+            aur_pkg_names = [aur_pkg_name_from_name(pkg_name, distro_name)
+                             for distro_name, pkg_names in distro_pkg_names.items()
+                             for pkg_name in pkg_names]
+            aur_future = executor.submit(wrap(load_aur), args, http_client, distro_names,
+                                         aur_pkg_names)
+        aur_adapter = aur_future.result()
+
+    for distro_name in distro_names:
+        distro_pkg_names[distro_name] = pkg_filter.filter_aur(distro_pkg_names[distro_name],
+                                                              distro_name, aur_adapter)
+
+    states = list()
+    checkers = dict()
+    for distro_name in distro_names:
+        state = None
+        if args.incremental:
+            state_file = args.state_file
+            if not state_file:
+                state_file = os.path.join(get_state_dir(), '%s.json' % distro_name)
+            state = StateStore(state_file)
+            states.append(state)
+        gh_adapter = make_gh_adapter(args, http_client, distro_name,
+                                     [aur_pkg_name_from_name(pkg_name, distro_name)
+                                      for pkg_name in distro_pkg_names[distro_name]])
+        checkers[distro_name] = DistroChecker(
+            distro_name, distro_versions[distro_name], aur_adapter, gh_adapter, pacman_db,
+            check_gh=args.show_outofsync, state=state)
+
+    shown_categories = {category for category, shown in [
+        ('missing', args.show_missing),
+        ('outdated', args.show_outdated),
+        ('outofsync', args.show_outofsync),
+        ('ahead', args.show_ahead),
+        ('newly_outdated', args.incremental),
+        ('unchecked', args.show_unchecked)] if shown}
+    stream = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    if args.format == 'report':
+        report = MultiDistroReport(distro_names, shown_categories,
+                                   installed_only=args.show_installed, stream=stream,
+                                   dependencies=distro_dependencies,
+                                   sort_by_impact=args.sort == 'impact',
+                                   rebuild_plan=args.rebuild_plan)
+    else:
+        report = SINKS[args.format](shown_categories, installed_only=args.show_installed,
+                                    stream=stream)
+    progress = Progress(sum(len(pkg_names) for pkg_names in distro_pkg_names.values()))
+
+    # All distributions share one pool of workers, so they are processed in parallel
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        futures = {executor.submit(wrap(checkers[distro_name].check_package), pkg_name): distro_name
+                   for distro_name in distro_names
+                   for pkg_name in distro_pkg_names[distro_name]}
+        for future in concurrent.futures.as_completed(futures):
+            pkg, categories = future.result()
+            # drop the finished future, so the package can be freed once it is written
+            report.add(futures.pop(future), pkg, categories)
+            progress.update()
+    progress.finish()
+    report.finish()
+    if args.output:
+        stream.close()
+
+    for state in states:
+        state.save()
+
+    if isinstance(http_client, CachedHTTPClient):
+        print("\n%s" % http_client.get_summary(), file=info_stream)
+
+
+def serve(args):
+    """Answer queries over HTTP until interrupted, refreshing the sources in the background"""
+    from helpers.server import StatusServer, StatusService  # not needed for single runs
+    distro_names = split_list(args.distro_name)
+    # The refresh intervals decide how often sources are checked, so cached responses are always
+    # revalidated. Unchanged responses are cheap 304s.
+    http_client, bundle = make_http_client(args, cache_ttl=0)
+
+    def load_distros():
+        # refreshes always download rosdistro, unless that is impossible
+        snapshots = (load_snapshots(args, distro_names) if args.offline
+                     else dict.fromkeys(distro_names))
+        index = get_index() if not args.replay and not all(snapshots.values()) else None
+        return {distro_name: load_distro(args, bundle, distro_name, index, snapshots[distro_name])
+                for distro_name in distro_names}
+
+    service = StatusService(
+        distro_names,
+        loaders={'installed': lambda: load_installed(args, bundle),
+                 'rosdistro': load_distros,
+                 'aur': lambda aur_pkg_names: load_aur(args, http_client, distro_names,
+                                                       aur_pkg_names),
+                 'github': lambda distro_name, aur_pkg_names: make_gh_adapter(
+                     args, http_client, distro_name, aur_pkg_names)},
+        intervals={'installed': args.refresh_installed, 'rosdistro': args.refresh_rosdistro,
+                   'aur': args.refresh_aur, 'github': args.refresh_github},
+        pkg_filter=make_package_filter(args), check_gh=args.show_outofsync, jobs=args.jobs)
+    print('Loading distro "%s". this might take a while...' % ', '.join(distro_names))
+    service.refresh()
+
+    server = StatusServer((args.host, args.port), service)
+    stop_event = threading.Event()
+    refresher = threading.Thread(target=service.run, args=(stop_event,), daemon=True)
+    refresher.start()
+    print('Serving on http://%s:%i' % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        server.server_close()
 
 
 if __name__ == "__main__":
@@ -24,34 +24,239 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
+import concurrent.futures
+import gzip
 import json
+import os
 import sys
-import urllib
+import urllib.parse
+
+from helpers.cache import get_cache_dir
+from helpers.http import FetchError, HTTPClient
+from helpers.stats import stats
+
+# Fields kept from the AUR records. Everything else is dropped to keep the memory footprint small.
+RECORD_FIELDS = ('Name', 'Version', 'Maintainer', 'LastModified')
+
+
+def trim_record(pkg):
+    """Returns a copy of an AURweb result record only holding RECORD_FIELDS"""
+    return {field: pkg.get(field) for field in RECORD_FIELDS}
+
+
+def index_packages(results):
+    """Build a name -> record dictionary from a list of trimmed AURweb result records"""
+    return {pkg['Name']: pkg for pkg in results}
+
+
+def iter_json_array(stream, chunk_size=64 * 1024):
+    """Incrementally decode the elements of a JSON array read from a text stream. Only the
+    element currently being decoded is kept in memory."""
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        # skip whitespace, the opening bracket and separators
+        while pos < len(buf) and (buf[pos].isspace() or buf[pos] == ','
+                                  or (buf[pos] == '[' and not started)):
+            started = started or buf[pos] == '['
+            pos += 1
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf):
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # a number is only complete once it is followed by a delimiter
+                if eof or isinstance(obj, (dict, list, str)) \
+                        or (end < len(buf) and buf[end] in ' \t\r\n,]'):
+                    yield obj
+                    pos = end
+                    continue
+        if eof:
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
 
 
 class AURAdapter():
-    """Wrapper for AURWeb rpc"""
+    """Wrapper for AURWeb rpc
+
+    By default all packages are found with a name search for the ros-<distro>- prefix. AURweb
+    caps the number of search results, so for large distributions the expected package names can
+    be given instead. These are then resolved exactly with batched multiinfo requests.
+
+    Alternatively, the packages can be taken from the metadata dump AUR publishes daily. It is
+    downloaded with a conditional request into ``dump_dir`` and parsed incrementally, keeping only
+    the ros packages.
+
+    ``distro_name`` can also be a list of distribution names, in which case the packages of all of
+    them are loaded. Searches are made concurrently, one per distribution."""
 
     aur_api_url = "https://aur.archlinux.org/rpc?v=5"
+    aur_dump_url = "https://aur.archlinux.org/packages-meta-v1.json.gz"
+    # AURweb rejects requests with a longer URI
+    max_url_length = 4400
+    # AURweb returns at most this many search results
+    max_results = 5000
 
-    def __init__(self, distro_name):
+    def __init__(self, distro_name, http_client=None, pkg_names=None, jobs=8, use_dump=False,
+                 dump_dir=None):
         self.distro_name = distro_name
-        self.packages = self._get_packages()
+        if isinstance(distro_name, str):
+            self.distro_names = [distro_name]
+        else:
+            self.distro_names = list(distro_name)
+        self.http_client = http_client if http_client else HTTPClient()
+        self.dump_dir = dump_dir if dump_dir else os.path.join(get_cache_dir(), 'aur')
+        if use_dump:
+            self.packages = index_packages(self._get_packages_dump())
+        elif pkg_names is None:
+            self.packages = index_packages(self._get_packages(jobs))
+        else:
+            self.packages = index_packages(self._get_packages_info(pkg_names, jobs))
 
+    def _query(self, url):
+        """Query the AUR RPC interface and return the parsed response. Raises FetchError if the
+        query failed, including errors AURweb reports inside a successful response."""
+        try:
+            response = self.http_client.get(url)
+        except OSError as err:
+            raise FetchError("Querying AUR failed: %s" % err) from err
+        if not response.ok():
+            raise FetchError("Querying AUR failed with status %i" % response.status)
+        try:
+            parsed_response = json.loads(response.body)
+        except ValueError as err:
+            raise FetchError("Could not parse the AUR response: %s" % err) from err
+        if parsed_response.get('type') == 'error':
+            raise FetchError("Querying AUR failed: %s" % parsed_response.get('error'))
+        return parsed_response
 
-    def _get_packages(self):
-        package_name = "ros-%s-" % self.distro_name
-        params = urllib.parse.urlencode({'type': 'search', 'arg': package_name})
-        response = urllib.request.urlopen("%s&%s" % (self.aur_api_url, params)).read()
-        parsed_response = json.loads(response)
-        if parsed_response['resultcount'] > 0:
-            return parsed_response['results']
-        # TODO throw
-        print("Could not find any package matching %s" % package_name, file=sys.stderr)
-        return list()
+    @classmethod
+    def get_search_url(cls, prefix):
+        """Returns the URL searching for all packages whose name contains ``prefix``"""
+        return "%s&%s" % (cls.aur_api_url,
+                          urllib.parse.urlencode({'type': 'search', 'by': 'name', 'arg': prefix}))
+
+    @stats.timed('aur.search')
+    def _search(self, prefix):
+        parsed_response = self._query(self.get_search_url(prefix))
+        if parsed_response['resultcount'] >= self.max_results:
+            raise FetchError("The AUR search for %s was truncated to %i results. Use --aur-query "
+                             "info or dump instead." % (prefix, parsed_response['resultcount']))
+        return [trim_record(pkg) for pkg in parsed_response['results']
+                if pkg['Name'].startswith(prefix)]
+
+    def _get_packages(self, jobs):
+        prefixes = ["ros-%s-" % distro_name for distro_name in self.distro_names]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, min(jobs, len(prefixes)))) as executor:
+            return [pkg for results in executor.map(self._search, prefixes) for pkg in results]
+
+    def _download_dump(self, dump_path):
+        """Download the metadata dump if it changed since the last download"""
+        meta_path = dump_path + '.json'
+        headers = dict()
+        try:
+            with open(meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            if os.path.exists(dump_path):
+                if meta.get('etag'):
+                    headers['If-None-Match'] = meta['etag']
+                if meta.get('last_modified'):
+                    headers['If-Modified-Since'] = meta['last_modified']
+        except (OSError, ValueError):
+            pass
+        try:
+            response = self.http_client.download(self.aur_dump_url, dump_path, headers)
+        except OSError as err:
+            raise FetchError("Downloading the AUR metadata dump failed: %s" % err) from err
+        if response.ok():
+            with open(meta_path, 'w', encoding='utf-8') as meta_file:
+                json.dump({'etag': response.headers.get('ETag'),
+                           'last_modified': response.headers.get('Last-Modified')}, meta_file)
+        elif response.status not in (304, 504):
+            # 504 is returned in offline mode, in which the previous download is used silently
+            raise FetchError("Downloading the AUR metadata dump failed with status %i"
+                             % response.status)
+
+    @stats.timed('aur.dump')
+    def _get_packages_dump(self):
+        os.makedirs(self.dump_dir, exist_ok=True)
+        dump_path = os.path.join(self.dump_dir, os.path.basename(self.aur_dump_url))
+        self._download_dump(dump_path)
+        if not os.path.exists(dump_path):
+            # only happens in offline mode, otherwise the download would have failed
+            raise FetchError("The AUR metadata dump was never downloaded to %s, so it is not "
+                             "available offline" % self.dump_dir)
+
+        prefixes = tuple("ros-%s-" % distro_name for distro_name in self.distro_names)
+        packages = list()
+        try:
+            with gzip.open(dump_path, 'rt', encoding='utf-8') as dump:
+                for pkg in iter_json_array(dump):
+                    if pkg['Name'].startswith(prefixes):
+                        packages.append(trim_record(pkg))
+        except (OSError, EOFError, ValueError) as err:
+            raise FetchError("Reading the AUR metadata dump %s failed: %s"
+                             % (dump_path, err)) from err
+        if not packages:
+            print("Could not find any package matching %s in the AUR metadata dump"
+                  % ', '.join(prefixes), file=sys.stderr)
+        return packages
+
+    @classmethod
+    def get_info_urls(cls, pkg_names):
+        """Returns the multiinfo request URLs resolving the given package names. The sorted names
+        are split into URLs not exceeding max_url_length."""
+        base_url = "%s&type=info" % cls.aur_api_url
+        urls = list()
+        url = base_url
+        for pkg_name in sorted(set(pkg_names)):
+            arg = "&%s" % urllib.parse.urlencode({'arg[]': pkg_name})
+            if url != base_url and len(url) + len(arg) > cls.max_url_length:
+                urls.append(url)
+                url = base_url
+            url += arg
+        if url != base_url:
+            urls.append(url)
+        return urls
+
+    @stats.timed('aur.info')
+    def _get_info_chunk(self, url):
+        return [trim_record(pkg) for pkg in self._query(url)['results']]
+
+    def _get_packages_info(self, pkg_names, jobs):
+        urls = self.get_info_urls(pkg_names)
+        packages = list()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for results in executor.map(self._get_info_chunk, urls):
+                packages.extend(results)
+        if not packages:
+            print("Could not find any of the requested packages in AUR", file=sys.stderr)
+        return packages
 
     def get_package_info(self, pkg_name):
-        for pkg in self.packages:
-            if pkg['Name'] == pkg_name:
-                return pkg
-        return None
+        return self.packages.get(pkg_name)
+
+    def get_package_infos(self, pkg_names):
+        """Bulk lookup. Returns a dictionary with the AUR record of every given package that exists
+        inside AUR."""
+        return {name: self.packages[name] for name in pkg_names if name in self.packages}
+
+    def get_missing_names(self, pkg_names):
+        """Returns the set of given package names that don't exist inside AUR"""
+        return set(pkg_names).difference(self.packages)
+
+    def get_unknown_names(self, pkg_names):
+        """Returns the set of AUR package names that are not part of the given package names,
+        e.g. AUR packages that are not part of the ROS distribution (anymore)."""
+        return set(self.packages).difference(pkg_names)
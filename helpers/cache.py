@@ -0,0 +1,184 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from helpers.http import HTTPClient, HTTPResponse
+from helpers.stats import stats
+
+
+def get_cache_dir():
+    """Returns the cache directory of this tool following the XDG base directory specification"""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'arch_ros_package_monitor')
+
+
+class CachedHTTPClient():
+    """HTTPClient with a persistent on-disk cache.
+
+    Cached responses younger than ``ttl`` seconds are returned directly. Older ones are revalidated
+    with a conditional request using the ETag and Last-Modified headers of the cached response. If
+    the cache grows beyond ``max_size`` bytes, the least recently used entries are evicted. In
+    offline mode no requests are made at all and uncached URLs are answered with status 504."""
+
+    def __init__(self, http_client=None, cache_dir=None, ttl=3600, max_size=200 * 1024 * 1024,
+                 offline=False):
+        self.http_client = http_client if http_client else HTTPClient()
+        self.cache_dir = cache_dir if cache_dir else os.path.join(get_cache_dir(), 'http')
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                         if entry.name.endswith('.body'))
+
+    def _entry_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _load(self, url):
+        path = self._entry_path(url)
+        try:
+            with open(path + '.json', encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            with open(path + '.body', 'rb') as body_file:
+                body = body_file.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('url') != url:
+            return None, None
+        return meta, body
+
+    def _write_atomic(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+
+    def _store(self, url, response):
+        path = self._entry_path(url)
+        meta = {'url': url,
+                'status': response.status,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched': time.time()}
+        try:
+            old_size = os.path.getsize(path + '.body')
+        except OSError:
+            old_size = 0
+        self._write_atomic(path + '.body', response.body)
+        self._write_atomic(path + '.json', json.dumps(meta).encode('utf-8'))
+        with self._lock:
+            self._size += len(response.body) - old_size
+            evict = self._size > self.max_size
+        if evict:
+            self._evict()
+
+    def _touch(self, url, meta=None):
+        path = self._entry_path(url)
+        if meta:
+            self._write_atomic(path + '.json', json.dumps(meta).encode('utf-8'))
+        try:
+            os.utime(path + '.body')
+        except OSError:
+            pass
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is below 90% of its maximum size"""
+        with self._lock:
+            entries = sorted((entry for entry in os.scandir(self.cache_dir)
+                              if entry.name.endswith('.body')),
+                             key=lambda entry: entry.stat().st_mtime)
+            for entry in entries:
+                if self._size <= 0.9 * self.max_size:
+                    break
+                size = entry.stat().st_size
+                base = entry.path[:-len('.body')]
+                for suffix in ('.body', '.json'):
+                    try:
+                        os.remove(base + suffix)
+                    except OSError:
+                        pass
+                self._size -= size
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+        stats.add('http cache', **{counter: 1})
+
+    def get(self, url, headers=None):
+        meta, body = self._load(url)
+        if meta and (self.offline or time.time() - meta['fetched'] < self.ttl):
+            self._count('hits')
+            self._touch(url)
+            return HTTPResponse(url, meta['status'], dict(), body)
+
+        if self.offline:
+            self._count('misses')
+            return HTTPResponse(url, 504, dict(), b'')
+
+        request_headers = dict(headers) if headers else dict()
+        if meta:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                request_headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.http_client.get(url, request_headers)
+        if response.status == 304 and meta:
+            self._count('revalidated')
+            meta['fetched'] = time.time()
+            self._touch(url, meta)
+            return HTTPResponse(url, meta['status'], response.headers, body)
+
+        self._count('misses')
+        # Negative results are cached as well, as most of them won't change between two runs.
+        if response.ok() or response.status == 404:
+            self._store(url, response)
+        return response
+
+    def download(self, url, path, headers=None):
+        """Download a URL into a file. Large downloads are not stored in the cache, the caller is
+        responsible for revalidating the file."""
+        if self.offline:
+            return HTTPResponse(url, 504, dict(), b'')
+        return self.http_client.download(url, path, headers)
+
+    def close(self):
+        self.http_client.close()
+
+    def get_summary(self):
+        return 'HTTP cache: %i hits, %i revalidated, %i misses' % (
+            self.hits, self.revalidated, self.misses)
@@ -0,0 +1,108 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import sys
+
+from helpers.http import FetchError
+from helpers.package import Package
+
+
+def aur_pkg_name_from_name(pkg_name, distro_name):
+    return "ros-%s-%s" % (distro_name, pkg_name.replace('_', '-'))
+
+
+class DistroChecker():
+    """Resolves and classifies the packages of a single ROS distribution.
+
+    The bulk sources (rosdistro versions, AUR records and installed packages) have to be loaded
+    before. check_package only fetches the per-package Github information and is safe to be
+    called from multiple threads."""
+
+    def __init__(self, distro_name, rosdistro_versions, aur_adapter, gh_adapter, pacman_db,
+                 check_gh=True, state=None):
+        self.distro_name = distro_name
+        self.rosdistro_versions = rosdistro_versions
+        self.aur_adapter = aur_adapter
+        self.gh_adapter = gh_adapter
+        self.pacman_db = pacman_db
+        self.check_gh = check_gh
+        self.state = state
+
+    def _get_gh_info(self, aur_pkg_name):
+        # New commits in the Github organization don't show up in any other input, so the PKGBUILD
+        # is always revalidated. Only parsing it is skipped if it didn't change.
+        known_info = self.state.get_gh_info(aur_pkg_name) if self.state else None
+        return self.gh_adapter.get_package_info(aur_pkg_name, known_info)
+
+    def check_package(self, pkg_name):
+        """Resolve all sources of a package and classify it. Returns the package and the set of
+        categories it belongs to."""
+        pkg = Package(pkg_name, self.pacman_db)
+        aur_pkg_name = aur_pkg_name_from_name(pkg_name, self.distro_name)
+        rosdistro_version = self.rosdistro_versions.get(pkg_name)
+        categories = set()
+        gh_pkg = None
+        try:
+            if not rosdistro_version:
+                categories.add('error')
+                print("No released version: %s" % pkg_name, file=sys.stderr)
+                return pkg, categories
+            pkg.add_rosdistro_version(rosdistro_version)
+
+            if self.check_gh:
+                try:
+                    gh_pkg = self._get_gh_info(aur_pkg_name)
+                except FetchError as err:
+                    # Still classify the package against AUR, it just can't be out of sync
+                    categories.add('unchecked')
+                    print(err, file=sys.stderr)
+                if gh_pkg:
+                    pkg.add_gh_information(gh_pkg)
+
+            aur_pkg = self.aur_adapter.get_package_info(aur_pkg_name)
+            if aur_pkg is None:
+                categories.add('missing')
+                return pkg, categories
+            pkg.add_aur_information(aur_pkg)
+
+            if pkg.is_outdated():
+                categories.add('outdated')
+                if self.state and self.state.is_newly_outdated(aur_pkg_name):
+                    categories.add('newly_outdated')
+            if pkg.is_outofsync():
+                categories.add('outofsync')
+            if pkg.is_ahead():
+                categories.add('ahead')
+
+        except TypeError as err:
+            categories.add('error')
+            print("Parsing error: %s\n%s" % (pkg_name, err), file=sys.stderr)
+        finally:
+            if self.state:
+                gh_pkg = gh_pkg or dict()
+                self.state.update(aur_pkg_name, {'gh_version': gh_pkg.get('version'),
+                                                 'gh_hash': gh_pkg.get('pkgbuild_hash'),
+                                                 'outdated': 'outdated' in categories})
+        return pkg, categories
@@ -0,0 +1,233 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import array
+import json
+import os
+import sys
+import tempfile
+
+from helpers.cache import get_cache_dir
+from helpers.stats import stats
+
+
+class DependencyGraph():
+    """Dependency graph of the packages of a distribution.
+
+    Packages are numbered by their sorted names. The dependencies of package ``i`` are
+    ``targets[offsets[i]:offsets[i + 1]]`` (compressed sparse row), so the whole graph is stored in
+    two integer arrays and every traversal is linear in the number of packages and edges.
+    Dependencies that aren't packages of the distribution, e.g. system dependencies, are dropped."""
+
+    def __init__(self, names, offsets, targets):
+        self.names = names
+        self.index = {name: i for i, name in enumerate(names)}
+        self.offsets = offsets
+        self.targets = targets
+        self._reverse = None
+        self._components = None
+        self._counts = None
+
+    @classmethod
+    def from_dependencies(cls, dependencies):
+        """Build the graph from a dictionary mapping each package to its dependency names"""
+        names = sorted(dependencies)
+        index = {name: i for i, name in enumerate(names)}
+        offsets = array.array('l', [0])
+        targets = array.array('l')
+        for name in names:
+            targets.extend(sorted({index[dependency] for dependency in dependencies[name]
+                                   if dependency in index and dependency != name}))
+            offsets.append(len(targets))
+        return cls(names, offsets, targets)
+
+    def get_dependencies(self, name):
+        i = self.index[name]
+        return [self.names[target] for target in self.targets[self.offsets[i]:self.offsets[i + 1]]]
+
+    def reverse(self):
+        """Returns the graph with all edges reversed, mapping each package to its dependents"""
+        if self._reverse is None:
+            size = len(self.names)
+            counts = [0] * (size + 1)
+            for target in self.targets:
+                counts[target + 1] += 1
+            for i in range(size):
+                counts[i + 1] += counts[i]
+            offsets = array.array('l', counts)
+            targets = array.array('l', [0]) * len(self.targets)
+            for source in range(size):
+                for target in self.targets[self.offsets[source]:self.offsets[source + 1]]:
+                    targets[counts[target]] = source
+                    counts[target] += 1
+            self._reverse = DependencyGraph(self.names, offsets, targets)
+            self._reverse._reverse = self
+        return self._reverse
+
+    def get_components(self):
+        """Returns the strongly connected components (Tarjan's algorithm). Each component only
+        depends on components before it, so this is a valid build order. Dependency cycles end up
+        inside a single component."""
+        if self._components is not None:
+            return self._components
+        size = len(self.names)
+        index = [-1] * size
+        lowlink = [0] * size
+        on_stack = bytearray(size)
+        stack = list()
+        components = list()
+        counter = 0
+        for root in range(size):
+            if index[root] != -1:
+                continue
+            index[root] = lowlink[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = 1
+            # explicit stack of (node, next edge) instead of recursion, as dependency chains can be
+            # deeper than the recursion limit
+            work = [(root, self.offsets[root])]
+            while work:
+                node, edge = work[-1]
+                if edge < self.offsets[node + 1]:
+                    work[-1] = (node, edge + 1)
+                    target = self.targets[edge]
+                    if index[target] == -1:
+                        index[target] = lowlink[target] = counter
+                        counter += 1
+                        stack.append(target)
+                        on_stack[target] = 1
+                        work.append((target, self.offsets[target]))
+                    elif on_stack[target]:
+                        lowlink[node] = min(lowlink[node], index[target])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = list()
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = 0
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+        self._components = components
+        return components
+
+    def get_reverse_dependency_counts(self):
+        """Returns a dictionary mapping each package to the number of packages depending on it
+        directly or transitively.
+
+        The components are visited dependents first, collecting the set of dependents of each
+        component as a bitset. This needs a single pass over all edges, each of them merging two
+        bitsets of (number of packages / 64) words."""
+        if self._counts is not None:
+            return self._counts
+        components = self.get_components()
+        reverse = self.reverse()
+        component_of = [0] * len(self.names)
+        for i, component in enumerate(components):
+            for member in component:
+                component_of[member] = i
+
+        reachable = [0] * len(components)
+        counts = dict()
+        for i in reversed(range(len(components))):
+            bits = 0
+            for member in components[i]:
+                bits |= 1 << member
+                for dependent in reverse.targets[reverse.offsets[member]:
+                                                 reverse.offsets[member + 1]]:
+                    if component_of[dependent] != i:
+                        bits |= reachable[component_of[dependent]]
+            reachable[i] = bits
+            count = bin(bits).count('1') - 1
+            for member in components[i]:
+                counts[self.names[member]] = count
+        self._counts = counts
+        return counts
+
+    def get_rebuild_order(self, pkg_names):
+        """Returns the given packages and all packages depending on them, ordered such that every
+        package comes after its dependencies. Packages unknown to the graph come first."""
+        reverse = self.reverse()
+        unknown = sorted({name for name in pkg_names if name not in self.index})
+        queue = list({self.index[name] for name in pkg_names if name in self.index})
+        affected = bytearray(len(self.names))
+        for node in queue:
+            affected[node] = 1
+        while queue:
+            node = queue.pop()
+            for dependent in reverse.targets[reverse.offsets[node]:reverse.offsets[node + 1]]:
+                if not affected[dependent]:
+                    affected[dependent] = 1
+                    queue.append(dependent)
+        return unknown + [self.names[member] for component in self.get_components()
+                          for member in component if affected[member]]
+
+
+@stats.timed('dependencies')
+def load_dependency_graph(distro_name, versions, get_dependencies, cache_dir=None):
+    """Build the dependency graph of a distribution.
+
+    Parsing the manifests is slow, so the dependencies of every package are cached together with
+    its released version. Only manifests of new or changed packages are parsed.
+    ``get_dependencies`` returns the dependency names of a package."""
+    if cache_dir is None:
+        cache_dir = os.path.join(get_cache_dir(), 'dependencies')
+    path = os.path.join(cache_dir, '%s.json' % distro_name)
+    cached = dict()
+    try:
+        with open(path, encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+    except (OSError, ValueError):
+        pass
+
+    dependencies = dict()
+    records = dict()
+    for pkg_name, version in versions.items():
+        record = cached.get(pkg_name)
+        if not record or record[0] != version:
+            try:
+                record = [version, list(get_dependencies(pkg_name))]
+            except Exception as err:
+                # A broken manifest must not break the whole report. It isn't cached, so it is
+                # tried again on the next run.
+                print("Could not read dependencies of %s: %s" % (pkg_name, err), file=sys.stderr)
+                dependencies[pkg_name] = list()
+                continue
+        records[pkg_name] = record
+        dependencies[pkg_name] = record[1]
+
+    if records != cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(records, tmp_file, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, path)
+    return DependencyGraph.from_dependencies(dependencies)
@@ -0,0 +1,72 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import fnmatch
+import re
+
+from helpers.checker import aur_pkg_name_from_name
+
+
+class PackageFilter():
+    """Selects the packages that should be checked at all.
+
+    The filters are applied before any per-package work is done. Name patterns and the installed
+    state only need the distribution file and the local pacman database, the maintainer filter
+    additionally needs the AUR records."""
+
+    def __init__(self, patterns=None, regex=None, installed_only=False, maintainers=None):
+        self.patterns = patterns
+        self.regex = re.compile(regex) if regex else None
+        self.installed_only = installed_only
+        self.maintainers = set(maintainers) if maintainers else None
+
+    def needs_aur(self):
+        return self.maintainers is not None
+
+    def _matches_name(self, pkg_name):
+        if self.patterns and not any(fnmatch.fnmatchcase(pkg_name, pattern)
+                                     for pattern in self.patterns):
+            return False
+        if self.regex and not self.regex.search(pkg_name):
+            return False
+        return True
+
+    def filter_local(self, pkg_names, distro_name, pacman_db):
+        """Apply the filters that don't need any network access"""
+        return [pkg_name for pkg_name in pkg_names
+                if self._matches_name(pkg_name)
+                and (not self.installed_only
+                     or pacman_db.is_installed(aur_pkg_name_from_name(pkg_name, distro_name)))]
+
+    def filter_aur(self, pkg_names, distro_name, aur_adapter):
+        """Apply the filters that need the AUR records"""
+        if self.maintainers is None:
+            return pkg_names
+        filtered = list()
+        for pkg_name in pkg_names:
+            aur_pkg = aur_adapter.get_package_info(aur_pkg_name_from_name(pkg_name, distro_name))
+            if aur_pkg and aur_pkg.get('Maintainer') in self.maintainers:
+                filtered.append(pkg_name)
+        return filtered
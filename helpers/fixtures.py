@@ -0,0 +1,163 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from helpers.http import HTTPResponse
+
+# Response headers stored along with recorded responses
+RECORDED_HEADERS = ('ETag', 'Last-Modified', 'Content-Type')
+
+
+class FixtureBundle():
+    """Directory holding everything a run read from external sources.
+
+    http/<hash>.json and http/<hash>.body hold the recorded HTTP responses, rosdistro/<distro>.json
+    the package names, versions and dependencies of a distribution and pacman.json the installed
+    packages."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _http_path(self, url):
+        return os.path.join(self.path, 'http', hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _write_json(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as json_file:
+            json.dump(data, json_file, separators=(',', ':'), sort_keys=True)
+
+    def _read_json(self, path):
+        with open(path, encoding='utf-8') as json_file:
+            return json.load(json_file)
+
+    def store_response(self, url, status, headers, body=None, body_path=None):
+        """Store a response. The body is either given as bytes or as path of a file."""
+        path = self._http_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if body_path is not None:
+            shutil.copyfile(body_path, path + '.body')
+        else:
+            with open(path + '.body', 'wb') as body_file:
+                body_file.write(body)
+        self._write_json(path + '.json', {
+            'url': url,
+            'status': status,
+            'headers': {header: headers.get(header) for header in RECORDED_HEADERS
+                        if headers.get(header) is not None}})
+
+    def load_response(self, url):
+        """Returns the recorded meta data and the path of the body, or None if url wasn't
+        recorded"""
+        path = self._http_path(url)
+        try:
+            meta = self._read_json(path + '.json')
+        except FileNotFoundError:
+            return None, None
+        return meta, path + '.body'
+
+    def store_rosdistro(self, distro_name, pkg_names, versions, dependencies=None):
+        self._write_json(os.path.join(self.path, 'rosdistro', '%s.json' % distro_name),
+                         {'packages': list(pkg_names), 'versions': versions,
+                          'dependencies': dependencies})
+
+    def load_rosdistro(self, distro_name):
+        data = self._read_json(os.path.join(self.path, 'rosdistro', '%s.json' % distro_name))
+        return data['packages'], data['versions']
+
+    def load_dependencies(self, distro_name):
+        """Returns the recorded dependencies of every package, or None if they weren't recorded"""
+        data = self._read_json(os.path.join(self.path, 'rosdistro', '%s.json' % distro_name))
+        return data.get('dependencies')
+
+    def store_pacman(self, packages):
+        self._write_json(os.path.join(self.path, 'pacman.json'), packages)
+
+    def load_pacman(self):
+        return self._read_json(os.path.join(self.path, 'pacman.json'))
+
+
+class RecordingHTTPClient():
+    """Passes requests to another HTTP client and records the responses into a FixtureBundle"""
+
+    def __init__(self, http_client, bundle):
+        self.http_client = http_client
+        self.bundle = bundle
+
+    def get(self, url, headers=None):
+        response = self.http_client.get(url, headers)
+        if response.status != 304:
+            self.bundle.store_response(url, response.status, response.headers, response.body)
+        return response
+
+    def download(self, url, path, headers=None):
+        # Download unconditionally, so the full body ends up in the bundle
+        response = self.http_client.download(url, path)
+        if response.ok():
+            self.bundle.store_response(url, response.status, response.headers, body_path=path)
+        return response
+
+    def close(self):
+        self.http_client.close()
+
+
+class ReplayHTTPClient():
+    """Stand-in for HTTPClient answering requests from a FixtureBundle. Every request is delayed
+    by ``latency`` seconds to simulate the network round trip. URLs that weren't recorded are
+    answered with status 404."""
+
+    def __init__(self, bundle, latency=0.0):
+        self.bundle = bundle
+        self.latency = latency
+
+    def _lookup(self, url):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.bundle.load_response(url)
+
+    def get(self, url, headers=None):
+        meta, body_path = self._lookup(url)
+        if meta is None:
+            return HTTPResponse(url, 404, dict(), b'')
+        with open(body_path, 'rb') as body_file:
+            return HTTPResponse(url, meta['status'], meta['headers'], body_file.read())
+
+    def download(self, url, path, headers=None):
+        meta, body_path = self._lookup(url)
+        if meta is None:
+            return HTTPResponse(url, 404, dict(), b'')
+        if headers and meta['headers'].get('ETag') \
+                and headers.get('If-None-Match') == meta['headers']['ETag'] \
+                and os.path.exists(path):
+            return HTTPResponse(url, 304, meta['headers'], b'')
+        shutil.copyfile(body_path, path)
+        return HTTPResponse(url, meta['status'], meta['headers'], b'')
+
+    def close(self):
+        pass
@@ -0,0 +1,204 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import concurrent.futures
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+
+from helpers.cache import get_cache_dir
+from helpers.github import GHAdapter
+from helpers.http import FetchError
+from helpers.stats import stats
+
+
+class GitMirrorAdapter():
+    """Alternative to GHAdapter reading the PKGBUILDs from local git mirrors.
+
+    The master branches of all ros-<distro>-arch repositories are fetched into a single bare
+    repository, each into its own ref refs/mirror/<pkg_name>. Refreshing the mirror therefore only
+    transfers new objects, and all PKGBUILDs can be read in one `git cat-file --batch` session.
+    The parsed versions are kept next to the mirror, so PKGBUILDs of repositories whose ref did not
+    move are not parsed again. In offline mode the mirror is used as is.
+
+    If fetching a repository fails, the ref from the last successful fetch is used. Without such a
+    ref the package raises FetchError, as opposed to repositories that don't exist."""
+
+    # Errors of git fetch meaning that there is no such repository. For repositories that don't
+    # exist Github asks for credentials instead of answering with 404.
+    missing_repo_errors = ('not found', 'does not appear to be a git repository',
+                           'could not read Username', "couldn't find remote ref")
+
+    def __init__(self, distro_name, mirror_dir=None, repo_base_url=None, offline=False):
+        self.distro_name = distro_name
+        self.offline = offline
+        if mirror_dir is None:
+            mirror_dir = os.path.join(get_cache_dir(), 'git')
+        if repo_base_url is None:
+            repo_base_url = "https://github.com/ros-%s-arch" % distro_name
+        self.repo_base_url = repo_base_url
+        self.repo_path = os.path.join(mirror_dir, '%s.git' % distro_name)
+        self.versions_path = os.path.join(mirror_dir, '%s.json' % distro_name)
+        self._infos = dict()
+        self._errors = dict()
+        self._lock = threading.Lock()
+
+    def _git(self, *args, **kwargs):
+        cmd = ['git', '-C', self.repo_path, '-c', 'gc.auto=0', '-c', 'maintenance.auto=false']
+        try:
+            return subprocess.run(cmd + list(args), stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE, check=False, **kwargs)
+        except FileNotFoundError as err:
+            raise FetchError("The git backend needs git to be installed") from err
+
+    def _init_repo(self):
+        if not os.path.isfile(os.path.join(self.repo_path, 'HEAD')):
+            os.makedirs(self.repo_path, exist_ok=True)
+            self._git('init', '--quiet', '--bare')
+
+    def _get_refs(self):
+        output = self._git('for-each-ref', '--format=%(objectname) %(refname)', 'refs/mirror/')
+        refs = dict()
+        for line in output.stdout.decode('utf-8').splitlines():
+            commit, ref = line.split(' ', 1)
+            refs[ref[len('refs/mirror/'):]] = commit
+        return refs
+
+    @stats.timed('github.git_fetch')
+    def _fetch(self, pkg_name):
+        """Fetch the master branch of a repository. Returns 'fetched', 'missing' if there is no
+        such repository or the error message of git."""
+        url = '/'.join([self.repo_base_url, pkg_name])
+        result = self._git('fetch', '--quiet', '--no-tags', url,
+                           '+refs/heads/master:refs/mirror/%s' % pkg_name,
+                           env=dict(os.environ, GIT_TERMINAL_PROMPT='0'))
+        if result.returncode == 0:
+            return 'fetched'
+        error = result.stderr.decode('utf-8', 'replace').strip()
+        if any(message in error for message in self.missing_repo_errors):
+            return 'missing'
+        return "Fetching %s failed: %s" % (url, error)
+
+    def _load_versions(self):
+        try:
+            with open(self.versions_path, encoding='utf-8') as versions_file:
+                return json.load(versions_file)
+        except (OSError, ValueError):
+            return dict()
+
+    def _save_versions(self, versions):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.versions_path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(versions, tmp_file, separators=(',', ':'))
+        os.replace(tmp_path, self.versions_path)
+
+    @stats.timed('github.git_read')
+    def _read_pkgbuilds(self, commits):
+        """Read the PKGBUILDs of the given {pkg_name: commit} dictionary in one cat-file session"""
+        pkgbuilds = dict()
+        if not commits:
+            return pkgbuilds
+        pkg_names = list(commits)
+        batch_input = ''.join('%s:PKGBUILD\n' % commits[pkg_name] for pkg_name in pkg_names)
+        output = self._git('cat-file', '--batch', input=batch_input.encode('utf-8')).stdout
+        pos = 0
+        for pkg_name in pkg_names:
+            header_end = output.index(b'\n', pos)
+            header = output[pos:header_end].split()
+            pos = header_end + 1
+            if len(header) != 3 or header[1] != b'blob':
+                # PKGBUILD missing in this repository
+                continue
+            size = int(header[2])
+            pkgbuilds[pkg_name] = output[pos:pos + size]
+            pos += size + 1
+        return pkgbuilds
+
+    def get_package_infos(self, pkg_names, jobs=8):
+        """Refresh the mirrors of the given packages in parallel and return a dictionary mapping
+        each package name to its package information, or None if there is no such repository.
+        Packages that could not be fetched are left out, get_package_info raises FetchError for
+        them."""
+        pkg_names = list(pkg_names)
+        with self._lock:
+            self._init_repo()
+            if self.offline:
+                refs = self._get_refs()
+                results = {pkg_name: 'fetched' if pkg_name in refs else 'missing'
+                           for pkg_name in pkg_names}
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+                    results = dict(zip(pkg_names, executor.map(self._fetch, pkg_names)))
+                refs = self._get_refs()
+
+            fetched = dict()
+            for pkg_name, result in results.items():
+                self._errors.pop(pkg_name, None)
+                if result not in ('fetched', 'missing'):
+                    if pkg_name not in refs:
+                        self._errors[pkg_name] = result
+                        self._infos.pop(pkg_name, None)
+                        continue
+                    print('%s\nUsing the mirror of the last successful fetch' % result,
+                          file=sys.stderr)
+                fetched[pkg_name] = result != 'missing'
+            pkg_names = list(fetched)
+
+            versions = self._load_versions()
+            changed = {pkg_name: refs[pkg_name] for pkg_name in pkg_names
+                       if fetched[pkg_name] and pkg_name in refs
+                       and versions.get(pkg_name, dict()).get('commit') != refs[pkg_name]}
+            for pkg_name, pkgbuild in self._read_pkgbuilds(changed).items():
+                match = GHAdapter.pkgver_regex.search(pkgbuild.decode('utf-8'))
+                if not match:
+                    print('Could not parse GH version for package %s' % pkg_name, file=sys.stderr)
+                    continue
+                versions[pkg_name] = {'commit': changed[pkg_name],
+                                      'version': match.group('version'),
+                                      'pkgbuild_hash': hashlib.sha1(pkgbuild).hexdigest()}
+            self._save_versions(versions)
+
+            for pkg_name in pkg_names:
+                record = versions.get(pkg_name)
+                if fetched[pkg_name] and record and record['commit'] == refs.get(pkg_name):
+                    self._infos[pkg_name] = {'name': pkg_name,
+                                             'version': record['version'],
+                                             'pkgbuild_hash': record['pkgbuild_hash']}
+                else:
+                    self._infos[pkg_name] = None
+            return {pkg_name: self._infos[pkg_name] for pkg_name in pkg_names}
+
+    def get_package_info(self, pkg_name, known_info=None):
+        # Parsed versions are already cached per commit, so known_info isn't needed
+        if pkg_name not in self._infos and pkg_name not in self._errors:
+            self.get_package_infos([pkg_name], jobs=1)
+        if pkg_name in self._errors:
+            raise FetchError(self._errors[pkg_name])
+        return self._infos[pkg_name]
@@ -24,33 +24,63 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 
-import sys
+import concurrent.futures
+import hashlib
 import re
-import urllib
+import sys
+
+from helpers.http import FetchError, HTTPClient
+from helpers.stats import stats
 
 
 class GHAdapter():
     """Wrapper for ros-<distro>-arch organization repos"""
 
-    def __init__(self, distro_name):
+    pkgver_regex = re.compile(r"pkgver\s*=\s*[\"']?(?P<version>[^\"'\s]+)[\"']?")
+
+    def __init__(self, distro_name, http_client=None, repo_base_url=None):
         self.distro_name = distro_name
-        self.repo_base_url = "https://raw.githubusercontent.com/ros-%s-arch" % distro_name
+        if repo_base_url is None:
+            repo_base_url = "https://raw.githubusercontent.com/ros-%s-arch" % distro_name
+        self.repo_base_url = repo_base_url
+        self.http_client = http_client if http_client else HTTPClient()
 
-    def get_package_info(self, pkg_name):
+    @stats.timed('github')
+    def get_package_info(self, pkg_name, known_info=None):
+        """Returns the name, version and PKGBUILD hash of a package or None if there is no
+        repository for it. Raises FetchError if the PKGBUILD could not be fetched. If the PKGBUILD
+        still has the hash of ``known_info``, that is returned without parsing it again."""
         pkg = {'name': pkg_name}
         pkgbuild_url = '/'.join([self.repo_base_url, pkg_name, "master/PKGBUILD"])
         # print(pkgbuild_url)
         try:
-            pkgbuild = urllib.request.urlopen(pkgbuild_url).read().decode('utf-8')
-            regex = r"pkgver\s*=\s*[\"']?(?P<version>[^\"']+)[\"']?"
-            match = re.search(regex, pkgbuild)
-            if match:
-                pkg['version'] = match.group('version')
-                return pkg
-            print('Could not parse GH version for package %s\nLink to PKGBUILD: %s'
-                  % (pkg_name, pkgbuild_url))
-        except urllib.request.URLError:
+            response = self.http_client.get(pkgbuild_url)
+        except OSError as err:
+            raise FetchError("Fetching %s failed: %s" % (pkgbuild_url, err)) from err
+        if response.status == 404:
             # did not find corresponding GH repository
             # print("Did not find package %s on Github" % pkg_name)
-            pass
+            return None
+        if not response.ok():
+            raise FetchError("Fetching %s failed with status %i" % (pkgbuild_url, response.status))
+        pkgbuild_hash = hashlib.sha1(response.body).hexdigest()
+        if known_info and known_info.get('pkgbuild_hash') == pkgbuild_hash:
+            return known_info
+        pkgbuild = response.body.decode('utf-8')
+        match = self.pkgver_regex.search(pkgbuild)
+        if match:
+            pkg['version'] = match.group('version')
+            pkg['pkgbuild_hash'] = pkgbuild_hash
+            return pkg
+        print('Could not parse GH version for package %s\nLink to PKGBUILD: %s'
+              % (pkg_name, pkgbuild_url), file=sys.stderr)
         return None
+
+    def get_package_infos(self, pkg_names, jobs=8):
+        """Fetch the package information of multiple packages concurrently using a pool of
+        ``jobs`` workers. Returns a dictionary mapping each package name to the result of
+        get_package_info."""
+        pkg_names = list(pkg_names)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            results = executor.map(self.get_package_info, pkg_names)
+            return dict(zip(pkg_names, results))
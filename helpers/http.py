@@ -0,0 +1,160 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+import os
+import shutil
+import tempfile
+import threading
+import urllib.parse
+
+from helpers.stats import stats
+
+
+class FetchError(Exception):
+    """Raised by the adapters if information could not be fetched, as opposed to not existing"""
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
+
+
+class HTTPResponse():
+    """Minimal response representation returned by HTTPClient"""
+
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def ok(self):
+        return 200 <= self.status < 300
+
+
+class HTTPClient():
+    """Small HTTP client that keeps one keep-alive connection per host and thread.
+
+    urllib.request opens a new connection (including the TLS handshake) for every request. When
+    fetching hundreds of small files from the same host that handshake dominates the run time, so
+    connections are reused here instead.
+
+    If a RequestScheduler is given, all requests are passed through it, which limits the requests
+    per host and retries failed or rate limited requests."""
+
+    def __init__(self, timeout=30, scheduler=None):
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self._local = threading.local()
+
+    def _get_connection(self, scheme, netloc):
+        # http.client (and the email package it uses) is only imported once a request is made,
+        # as runs answered from the cache don't need it
+        import http.client
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = dict()
+        key = (scheme, netloc)
+        if key not in connections:
+            if scheme == 'https':
+                connections[key] = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                connections[key] = http.client.HTTPConnection(netloc, timeout=self.timeout)
+        return connections[key]
+
+    def _drop_connection(self, scheme, netloc):
+        connection = self._local.connections.pop((scheme, netloc), None)
+        if connection:
+            connection.close()
+
+    def get(self, url, headers=None, stream_to=None):
+        """Perform a GET request. Network errors are raised as OSError, HTTP error codes are
+        returned as part of the response. If ``stream_to`` is given, a successful response body is
+        written to that file object instead of being returned."""
+        if self.scheduler is None:
+            return self._get(url, headers, stream_to)
+        return self.scheduler.execute(urllib.parse.urlsplit(url).netloc,
+                                      lambda: self._get(url, headers, stream_to))
+
+    def _get(self, url, headers, stream_to):
+        import http.client
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        request_headers = {'User-Agent': 'arch_ros_package_monitor'}
+        if headers:
+            request_headers.update(headers)
+
+        # A kept-alive connection might have been closed by the server in the meantime. Retry
+        # exactly once on a fresh connection in that case.
+        for attempt in range(2):
+            connection = self._get_connection(parsed.scheme, parsed.netloc)
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+                if stream_to is not None and 200 <= response.status < 300:
+                    stream_to.seek(0)
+                    stream_to.truncate()
+                    shutil.copyfileobj(response, stream_to, 64 * 1024)
+                    body = b''
+                    size = stream_to.tell()
+                else:
+                    body = response.read()
+                    size = len(body)
+            except (http.client.HTTPException, OSError) as err:
+                self._drop_connection(parsed.scheme, parsed.netloc)
+                if attempt:
+                    stats.add('http %s' % parsed.netloc, errors=1)
+                    if isinstance(err, OSError):
+                        raise
+                    raise ConnectionError(str(err)) from err
+                stats.add('http %s' % parsed.netloc, retries=1)
+                continue
+            stats.add('http %s' % parsed.netloc, requests=1, bytes=size)
+            if response.will_close:
+                self._drop_connection(parsed.scheme, parsed.netloc)
+            return HTTPResponse(url, response.status, response.msg, body)
+
+    def download(self, url, path, headers=None):
+        """Download a URL into a file without keeping the body in memory. The file is only
+        replaced if the request was successful."""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                response = self.get(url, headers, stream_to=tmp_file)
+            if response.ok():
+                os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return response
+
+    def close(self):
+        """Close all connections opened by the calling thread"""
+        connections = getattr(self._local, 'connections', dict())
+        for connection in connections.values():
+            connection.close()
+        connections.clear()
@@ -24,9 +24,11 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import re
-import subprocess
 import sys
 
+from helpers.pacman import get_default_db
+from helpers.stats import stats
+
 
 class VersionParsingException(Exception):
     def __init__(self, message):
@@ -34,64 +36,158 @@ class VersionParsingException(Exception):
         super().__init__(self.message)
 
 
+# Alphanumeric segments as understood by pacman's vercmp. Everything else is a separator.
+_segment_regex = re.compile(r'([^0-9A-Za-z]*)(?:([0-9]+)|([A-Za-z]+))')
+_epoch_regex = re.compile(r'([0-9]*):')
+
+# Element kinds of a version key. The end of a version sorts between an alphabetic and a numeric
+# segment, so that 1.0a < 1.0a1 < 1.0 < 1.0.1, as in pacman.
+_ALPHA = 1
+_END = 2
+_NUMERIC = 3
+
+
+def _version_key(version_string):
+    """Build a tuple that orders like pacman's rpmvercmp.
+
+    Each alphanumeric segment is represented by the length of the separator in front of it, its
+    kind and its value. Trailing separators make a version newer than the same version without
+    them, just like in rpmvercmp. The only deviation from rpmvercmp is that a version with
+    trailing separators is older instead of newer than one continuing with a separated
+    alphabetic segment (1.0. vs 1.0.a), as rpmvercmp isn't transitive in that case."""
+    key = list()
+    pos = 0
+    for match in _segment_regex.finditer(version_string):
+        separator, number, alpha = match.groups()
+        if number is not None:
+            key.append((len(separator), _NUMERIC, int(number)))
+        else:
+            key.append((len(separator), _ALPHA, alpha))
+        pos = match.end()
+    if pos < len(version_string):
+        key.append((0, _END, 1))
+    else:
+        key.append((0, _END))
+    return tuple(key)
+
+
 class Version():
-    """Version representation"""
+    """Version representation following pacman's vercmp semantics.
+
+    A version has the form [epoch:]pkgver[-pkgrel]. Versions are totally ordered, so they can be
+    sorted and used as keys: a version without pkgrel is older than the same version with any
+    pkgrel. Pacman instead ignores the pkgrel if only one version has one, which isn't transitive
+    and is only done by vercmp(). Versions are immutable and instances are interned, so parsing the
+    same version string twice returns the same object."""
 
-    def __init__(self, version_string):
-        self.major = 0
-        self.minor = 0
-        self.bugfix = 0
-        self.parse(version_string)
+    __slots__ = ('_string', '_key', '_rel_key', '_hash')
 
-    def parse(self, version_string):
-        regex = re.compile(r'(?P<major>\d+)\.(?P<minor>\d+)\.(?P<bugfix>\d+)')
-        match = re.match(regex, version_string)
+    _cache = dict()
+    cache_size = 65536
+
+    def __new__(cls, version_string):
+        version = cls._cache.get(version_string)
+        if version is None:
+            version = super().__new__(cls)
+            version._parse(version_string)
+            if len(cls._cache) < cls.cache_size:
+                cls._cache[version_string] = version
+        return version
+
+    def _parse(self, version_string):
+        if not isinstance(version_string, str):
+            raise VersionParsingException('Could not parse version %s' % (version_string,))
+        epoch = 0
+        pkgver = version_string
+        match = _epoch_regex.match(pkgver)
         if match:
-            self.major = int(match.group('major'))
-            self.minor = int(match.group('minor'))
-            self.bugfix = int(match.group('bugfix'))
-        else:
+            epoch = int(match.group(1) or 0)
+            pkgver = pkgver[match.end():]
+        pkgrel = None
+        if '-' in pkgver:
+            pkgver, pkgrel = pkgver.rsplit('-', 1)
+        if not _segment_regex.search(pkgver):
             raise VersionParsingException('Could not parse version %s' % (version_string))
 
+        self._string = version_string
+        self._key = (epoch, _version_key(pkgver))
+        self._rel_key = _version_key(pkgrel) if pkgrel is not None else None
+        self._hash = hash((self._key, self._rel_key))
+
+    def _compare(self, other, ignore_missing_rel=False):
+        if self._key != other._key:
+            return -1 if self._key < other._key else 1
+        if self._rel_key == other._rel_key:
+            return 0
+        if self._rel_key is None or other._rel_key is None:
+            if ignore_missing_rel:
+                return 0
+            return -1 if self._rel_key is None else 1
+        return -1 if self._rel_key < other._rel_key else 1
+
     def __eq__(self, other):
-        return self.major == other.major \
-            and self.minor == other.minor \
-            and self.bugfix == other.bugfix
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self is other or self._compare(other) == 0
+
+    def __ne__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self is not other and self._compare(other) != 0
 
     def __gt__(self, other):
-        if self.major == other.major:
-            if self.minor == other.minor:
-                return self.bugfix > other.bugfix
-            else:
-                return self.minor > other.minor
-        else:
-            return self.major > other.major
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._compare(other) > 0
 
     def __lt__(self, other):
-        if self.major == other.major:
-            if self.minor == other.minor:
-                return self.bugfix < other.bugfix
-            else:
-                return self.minor < other.minor
-        else:
-            return self.major < other.major
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._compare(other) < 0
 
     def __ge__(self, other):
-        return self == other or self > other
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._compare(other) >= 0
 
     def __le__(self, other):
-        return self == other or self < other
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._compare(other) <= 0
+
+    def __hash__(self):
+        return self._hash
 
     def __str__(self):
-        return '%i.%i.%i' % (self.major, self.minor, self.bugfix)
+        return self._string
+
+    def __repr__(self):
+        return 'Version(%r)' % self._string
+
+
+def vercmp(version_a, version_b):
+    """Compare two versions like pacman's vercmp. Returns -1, 0 or 1. Unlike the ordering of
+    Version, the pkgrel is only taken into account if both versions have one, so a rosdistro
+    version 1.2.3 equals the AUR version 1.2.3-2. Versions are given as strings or Version, other
+    types raise TypeError like the comparison operators."""
+    version_a, version_b = [Version(version) if isinstance(version, str) else version
+                            for version in (version_a, version_b)]
+    if not isinstance(version_a, Version) or not isinstance(version_b, Version):
+        raise TypeError("Can not compare %r with %r" % (version_a, version_b))
+    return version_a._compare(version_b, ignore_missing_rel=True)
 
 
 class Package():
     """Package representation that contains information from multiple sources such as AUR and
     rosdistro"""
 
-    def __init__(self, pkg_name):
+    # Thousands of packages are alive at once, so don't give every one of them a __dict__
+    __slots__ = ('package_name', '_pacman_db', '_rosdistro_version', '_aur_version',
+                 '_aur_maintainer', '_gh_version', '_installed', '_installed_version')
+
+    def __init__(self, pkg_name, pacman_db=None):
         self.package_name = pkg_name
+        self._pacman_db = pacman_db
 
         self._rosdistro_version = None
         self._aur_version = None
@@ -113,8 +209,12 @@ class Package():
 
     def add_rosdistro_information(self, pkg_info):
         """Add information from a parsed package manifest"""
+        self.add_rosdistro_version(pkg_info.version)
+
+    def add_rosdistro_version(self, version_str):
+        """Add the version released inside the rosdistro"""
         try:
-            self._rosdistro_version = Version(pkg_info.version)
+            self._rosdistro_version = Version(version_str)
         except VersionParsingException as err:
             print("Error parsing rosdistro version of package %s: %s" % (self.package_name, err.message),
                   file=sys.stderr)
@@ -131,19 +231,19 @@ class Package():
         """Returns information whether this package is outdated inside AUR. If it doesn't have a
         corresponding AUR package, False is returned."""
         if self._aur_version:
-            return self._rosdistro_version > self._aur_version
+            return vercmp(self._rosdistro_version, self._aur_version) > 0
         return False
 
     def is_ahead(self):
         if self._aur_version:
-            return self._rosdistro_version < self._aur_version
+            return vercmp(self._rosdistro_version, self._aur_version) < 0
         return False
 
     def is_outofsync(self):
         """Returns information whether the AUR version differs from the on on Github. If either the
         AUR version or the Github version is missing, False is returned."""
         if self._aur_version and self._gh_version:
-            if self._gh_version != self._aur_version:
+            if vercmp(self._gh_version, self._aur_version) != 0:
                 return True
         return False
 
@@ -156,21 +256,30 @@ class Package():
     def is_installed(self):
         return self._installed
 
+    @stats.timed('pacman.lookup')
     def update_installed_status(self, pkg_name):
         """Checks whether the package is installed locally"""
-        cmd = ["pacman", "--noconfirm", "-Q", pkg_name]
-        process = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
-        output = process.communicate()
+        pacman_db = self._pacman_db if self._pacman_db else get_default_db()
+        version_str = pacman_db.get_installed_version(pkg_name)
 
-        if process.returncode == 0:
+        if version_str:
             self._installed = True
-            version_str = output[0].decode('utf-8').split()[1]
             try:
                 self._installed_version = Version(version_str)
             except VersionParsingException as err:
                 print("Error parsing rosdistro version of package %s: %s" % (self.package_name, err.message),
                       file=sys.stderr)
 
+    def to_dict(self):
+        """Returns the versions of this package as a JSON serializable dictionary"""
+        return {'name': self.package_name,
+                'rosdistro': str(self._rosdistro_version) if self._rosdistro_version else None,
+                'aur': str(self._aur_version) if self._aur_version else None,
+                'maintainer': self._aur_maintainer,
+                'github': str(self._gh_version) if self._gh_version else None,
+                'installed': (str(self._installed_version) if self._installed_version
+                              else None)}
+
     def __str__(self):
         output = '%s:' % self.package_name
         output += '\n - rosdistro: %s' % self._rosdistro_version
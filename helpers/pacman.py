@@ -0,0 +1,111 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import glob
+import os
+import subprocess
+import sys
+import threading
+
+from helpers.stats import stats
+
+
+def parse_desc(path):
+    """Parse name and version out of a pacman local database desc file"""
+    fields = dict()
+    key = None
+    with open(path, encoding='utf-8') as desc_file:
+        for line in desc_file:
+            line = line.strip()
+            if line.startswith('%') and line.endswith('%'):
+                key = line[1:-1]
+            elif line and key in ('NAME', 'VERSION') and key not in fields:
+                fields[key] = line
+            if len(fields) == 2:
+                break
+    return fields.get('NAME'), fields.get('VERSION')
+
+
+class PacmanDB():
+    """Snapshot of the packages installed on the local system.
+
+    The snapshot is taken once, either with a single `pacman -Q` call or, if a database path is
+    given, by reading the local database inside that path directly. Alternatively, a dictionary
+    mapping package names to their installed versions can be given."""
+
+    @stats.timed('pacman.snapshot')
+    def __init__(self, db_path=None, packages=None):
+        self.db_path = db_path
+        if packages is not None:
+            self.packages = dict(packages)
+        elif db_path:
+            self.packages = self._read_local_db(db_path)
+        else:
+            self.packages = self._query_pacman()
+
+    @staticmethod
+    def _read_local_db(db_path):
+        packages = dict()
+        for desc in glob.glob(os.path.join(db_path, 'local', '*', 'desc')):
+            name, version = parse_desc(desc)
+            if name and version:
+                packages[name] = version
+        return packages
+
+    @staticmethod
+    def _query_pacman():
+        packages = dict()
+        cmd = ["pacman", "--noconfirm", "-Q"]
+        try:
+            process = subprocess.Popen(cmd, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            print("Could not find pacman. Assuming no packages are installed.", file=sys.stderr)
+            return packages
+        output = process.communicate()
+        for line in output[0].decode('utf-8').splitlines():
+            fields = line.split()
+            if len(fields) == 2:
+                packages[fields[0]] = fields[1]
+        return packages
+
+    def get_installed_version(self, pkg_name):
+        """Returns the installed version string of a package or None if it isn't installed"""
+        return self.packages.get(pkg_name)
+
+    def is_installed(self, pkg_name):
+        return pkg_name in self.packages
+
+
+_default_db = None
+_default_db_lock = threading.Lock()
+
+
+def get_default_db():
+    """Returns a process wide snapshot of the system's pacman database, created on first use"""
+    global _default_db
+    with _default_db_lock:
+        if _default_db is None:
+            _default_db = PacmanDB()
+        return _default_db
@@ -0,0 +1,218 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import csv
+import json
+import sys
+
+
+class TextReport():
+    """Plain text report listing the packages grouped by category.
+
+    Packages are added as soon as they are classified, the sections are written once all
+    packages are known. If the dependency graph of the distribution is given, packages can be
+    sorted by the number of packages depending on them and a rebuild plan for the outdated and
+    missing packages can be written."""
+
+    sections = [('missing', 'Missing packages'),
+                ('outdated', 'Outdated packages'),
+                ('outofsync', 'Out of sync packages'),
+                ('ahead', 'Ahead packages'),
+                ('newly_outdated', 'Newly outdated packages since last run'),
+                ('unchecked', 'Packages that could not be checked')]
+
+    def __init__(self, shown_categories, installed_only=False, stream=sys.stdout,
+                 dependencies=None, sort_by_impact=False, rebuild_plan=False):
+        self.shown_categories = shown_categories
+        self.installed_only = installed_only
+        self.stream = stream
+        self.dependencies = dependencies
+        self.sort_by_impact = sort_by_impact and dependencies is not None
+        self.rebuild_plan = rebuild_plan and dependencies is not None
+        self._packages = {category: list() for category, _ in self.sections}
+        self._affected = set()
+
+    def add(self, pkg, categories):
+        if self.installed_only and not pkg.is_installed():
+            return
+        if 'outdated' in categories or 'missing' in categories:
+            self._affected.add(pkg.package_name)
+        for category in categories:
+            if category in self._packages and category in self.shown_categories:
+                self._packages[category].append(pkg)
+
+    def get_counts(self):
+        return {category: len(pkgs) for category, pkgs in self._packages.items()}
+
+    def finish(self):
+        counts = dict()
+        if self.dependencies is not None:
+            counts = self.dependencies.get_reverse_dependency_counts()
+        for category, title in self.sections:
+            if category not in self.shown_categories:
+                continue
+            print("\n%s:" % title, file=self.stream)
+            if self.sort_by_impact:
+                pkgs = sorted(self._packages[category],
+                              key=lambda pkg: (-counts.get(pkg.package_name, 0), pkg.package_name))
+            else:
+                pkgs = sorted(self._packages[category], key=lambda pkg: pkg.package_name)
+            for pkg in pkgs:
+                print(pkg, file=self.stream)
+                if self.sort_by_impact:
+                    print(" - Dependents: %i" % counts.get(pkg.package_name, 0), file=self.stream)
+
+        if self.rebuild_plan:
+            print("\nRebuild plan (dependencies first):", file=self.stream)
+            order = self.dependencies.get_rebuild_order(self._affected)
+            for i, pkg_name in enumerate(order, 1):
+                print("%4i. %s%s" % (i, pkg_name,
+                                     '' if pkg_name in self._affected else ' (dependent)'),
+                      file=self.stream)
+
+
+class MultiDistroReport():
+    """Combined text report of multiple distributions. Each distribution gets its own
+    TextReport, followed by a summary with the number of packages per category and distro."""
+
+    def __init__(self, distro_names, shown_categories, installed_only=False, stream=sys.stdout,
+                 dependencies=None, sort_by_impact=False, rebuild_plan=False):
+        self.distro_names = distro_names
+        self.stream = stream
+        dependencies = dependencies or dict()
+        self.reports = {distro_name: TextReport(shown_categories, installed_only, stream,
+                                                dependencies.get(distro_name), sort_by_impact,
+                                                rebuild_plan)
+                        for distro_name in distro_names}
+
+    def add(self, distro_name, pkg, categories):
+        self.reports[distro_name].add(pkg, categories)
+
+    def finish(self):
+        if len(self.distro_names) == 1:
+            self.reports[self.distro_names[0]].finish()
+            return
+
+        for distro_name in self.distro_names:
+            print("\n=== %s ===" % distro_name, file=self.stream)
+            self.reports[distro_name].finish()
+
+        shown_sections = [(category, title) for category, title in TextReport.sections
+                          if category in self.reports[self.distro_names[0]].shown_categories]
+        print("\nSummary:", file=self.stream)
+        print("%-12s" % 'distro' + ''.join(' %14s' % category for category, _ in shown_sections),
+              file=self.stream)
+        for distro_name in self.distro_names:
+            counts = self.reports[distro_name].get_counts()
+            print("%-12s" % distro_name
+                  + ''.join(' %14i' % counts[category] for category, _ in shown_sections),
+                  file=self.stream)
+
+
+class StreamingSink():
+    """Base class of the outputs writing every package as soon as it is classified. Nothing is
+    buffered, so the memory usage doesn't grow with the number of packages. Packages are written
+    once with all of their shown categories."""
+
+    def __init__(self, shown_categories, installed_only=False, stream=sys.stdout):
+        self.shown_categories = shown_categories
+        self.installed_only = installed_only
+        self.stream = stream
+
+    def add(self, distro_name, pkg, categories):
+        if self.installed_only and not pkg.is_installed():
+            return
+        shown = [category for category, _ in TextReport.sections
+                 if category in categories and category in self.shown_categories]
+        if shown:
+            self.write(distro_name, pkg, shown)
+
+    def write(self, distro_name, pkg, categories):
+        raise NotImplementedError
+
+    def finish(self):
+        self.stream.flush()
+
+
+class TextSink(StreamingSink):
+    """One line of text per package"""
+
+    def write(self, distro_name, pkg, categories):
+        versions = pkg.to_dict()
+        print("%s %s %s rosdistro=%s aur=%s github=%s installed=%s" % (
+            distro_name, ','.join(categories), pkg.package_name, versions['rosdistro'],
+            versions['aur'], versions['github'], versions['installed']), file=self.stream)
+
+
+class JSONLinesSink(StreamingSink):
+    """One JSON object per line and package"""
+
+    def write(self, distro_name, pkg, categories):
+        record = pkg.to_dict()
+        record['distro'] = distro_name
+        record['categories'] = categories
+        self.stream.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+class CSVSink(StreamingSink):
+    """CSV table with a header and one row per package. Multiple categories are separated by
+    semicolons."""
+
+    fields = ['distro', 'name', 'categories', 'rosdistro', 'aur', 'maintainer', 'github',
+              'installed']
+
+    def __init__(self, shown_categories, installed_only=False, stream=sys.stdout):
+        super().__init__(shown_categories, installed_only, stream)
+        self._writer = csv.DictWriter(stream, self.fields)
+        self._writer.writeheader()
+
+    def write(self, distro_name, pkg, categories):
+        record = pkg.to_dict()
+        record['distro'] = distro_name
+        record['categories'] = ';'.join(categories)
+        self._writer.writerow(record)
+
+
+SINKS = {'text': TextSink, 'jsonl': JSONLinesSink, 'csv': CSVSink}
+
+
+class Progress():
+    """Progress counter written to an interactive terminal"""
+
+    def __init__(self, total, stream=sys.stderr):
+        self.total = total
+        self.done = 0
+        self.stream = stream
+        self.enabled = stream.isatty()
+
+    def update(self, count=1):
+        self.done += count
+        if self.enabled:
+            print("\rChecked %i/%i packages" % (self.done, self.total), end='', file=self.stream,
+                  flush=True)
+
+    def finish(self):
+        if self.enabled:
+            print(file=self.stream)
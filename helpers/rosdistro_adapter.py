@@ -23,30 +23,121 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+# rosdistro and catkin_pkg pull in large YAML and XML stacks, so they are imported on first use
+# only. Runs answered from the version snapshot don't need them at all.
 
-import rosdistro
-from catkin_pkg import package
+import os
+import pickle
+import tempfile
+import time
+
+from helpers.cache import get_cache_dir
+from helpers.http import FetchError
+from helpers.stats import stats
+
+# Dependencies requiring a rebuild or blocking the installation of a package
+DEPENDENCY_TYPES = ['buildtool_depends', 'build_depends', 'build_export_depends',
+                    'buildtool_export_depends', 'exec_depends']
+
+
+@stats.timed('rosdistro.index')
+def get_index():
+    """Get the rosdistro index. It can be shared between multiple RosdistroAdapter objects."""
+    import rosdistro
+    try:
+        return rosdistro.get_index(rosdistro.get_index_url())
+    except OSError as err:
+        raise FetchError("Downloading the rosdistro index failed: %s" % err) from err
+
+
+def get_snapshot_path(distro_name):
+    return os.path.join(get_cache_dir(), 'rosdistro', '%s.pickle' % distro_name)
+
+
+@stats.timed('rosdistro.snapshot')
+def load_version_snapshot(distro_name, max_age):
+    """Returns the package names and versions of a distribution stored by store_version_snapshot,
+    or None if there is no snapshot younger than ``max_age`` seconds"""
+    path = get_snapshot_path(distro_name)
+    try:
+        if time.time() - os.path.getmtime(path) > max_age:
+            return None
+        with open(path, 'rb') as snapshot_file:
+            return pickle.load(snapshot_file)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        return None
+
+
+def store_version_snapshot(distro_name, pkg_names, versions):
+    """Store the package names and versions of a distribution. Loading the snapshot only takes
+    a few milliseconds, compared to seconds for downloading and parsing the distribution."""
+    path = get_snapshot_path(distro_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'wb') as tmp_file:
+        pickle.dump((list(pkg_names), versions), tmp_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
 
 
 class RosdistroAdapter(object):
-    """Small python wrapper to quickly query package information out of a rosdistro"""
+    """Small python wrapper to quickly query package information out of a rosdistro. The
+    distribution is downloaded on first use."""
 
-    def __init__(self, distro_name):
+    def __init__(self, distro_name, index=None):
         super(RosdistroAdapter, self).__init__()
-        self._index = None
+        self._index = index
         self._distro_name = distro_name
-        self._distro = self.get_distro()
+        self._cached_distro = None
+
+    @property
+    def _distro(self):
+        if self._cached_distro is None:
+            self._cached_distro = self.get_distro()
+        return self._cached_distro
 
+    @stats.timed('rosdistro.distribution')
     def get_distro(self):
         """Get a rosdistro object from the distro name configured in this object"""
-        self._index = rosdistro.get_index(rosdistro.get_index_url())
+        import rosdistro
+        if self._index is None:
+            self._index = get_index()
         return rosdistro.get_cached_distribution(self._index, self._distro_name)
 
+    @stats.timed('rosdistro.manifest')
     def get_package_by_name(self, package_name):
-        """Get a package representation from a package name"""
+        """Get a package representation from a package name. This fetches and parses the full
+        package manifest. If only the version is required, use get_package_versions instead."""
+        from catkin_pkg import package
         manifest = self._distro.get_release_package_xml(package_name)
         return package.parse_package_string(manifest)
 
+    def get_package_dependencies(self, package_name):
+        """Get the names of all build and run dependencies of a package from its manifest.
+        Packages without a released manifest have no dependencies."""
+        if not self._distro.get_release_package_xml(package_name):
+            return list()
+        manifest = self.get_package_by_name(package_name)
+        return sorted({dependency.name
+                       for dependency_type in DEPENDENCY_TYPES
+                       for dependency in getattr(manifest, dependency_type)})
+
     def get_package_list(self):
-        distr_file = rosdistro.get_distribution_file(self._index, self._distro_name)
-        return distr_file.release_packages.keys()
+        # The cached distribution already contains the distribution file, so there is no need to
+        # download and parse it a second time.
+        return self._distro.release_packages.keys()
+
+    @stats.timed('rosdistro.versions')
+    def get_package_versions(self):
+        """Get the released version of every package in the distribution.
+
+        The versions are taken from the release repositories inside the distribution file, so no
+        package manifest has to be parsed. Packages without a released version map to None."""
+        versions = dict()
+        for pkg_name, pkg in self._distro.release_packages.items():
+            repo = self._distro.repositories[pkg.repository_name].release_repository
+            version = None
+            if repo and repo.version:
+                # strip the release increment, e.g. 1.2.3-1 -> 1.2.3
+                version = repo.version.rsplit('-', 1)[0]
+            versions[pkg_name] = version
+        return versions
@@ -0,0 +1,195 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import random
+import threading
+import time
+
+from helpers.stats import stats
+
+
+def _parse_retry_after(value):
+    """Parse a Retry-After header, which is either a number of seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _get_reset_delay(headers):
+    """Returns the number of seconds until the rate limit given in X-RateLimit-Reset resets"""
+    try:
+        return max(0.0, float(headers.get('X-RateLimit-Reset')) - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def get_throttle_delay(response):
+    """Returns the number of seconds the server asks us to wait before the next request, or None
+    if the response isn't rate limited"""
+    headers = response.headers
+    retry_after = _parse_retry_after(headers.get('Retry-After'))
+    exhausted = headers.get('X-RateLimit-Remaining') == '0'
+    if response.status == 429 or (response.status == 403
+                                   and (exhausted or retry_after is not None)):
+        if retry_after is not None:
+            return retry_after
+        reset_delay = _get_reset_delay(headers)
+        return reset_delay if reset_delay is not None else 0.0
+    if response.status == 503 and retry_after is not None:
+        return retry_after
+    return None
+
+
+class HostLimiter():
+    """Limits the requests to a single host.
+
+    At most ``limit`` requests are in flight at the same time and new requests are started at
+    no more than ``rate`` requests per second (token bucket with a capacity of ``burst``). The
+    concurrency limit adapts additively increasing on success and halving when being throttled.
+    """
+
+    def __init__(self, max_concurrency, rate=None, burst=10):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.active = 0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    self._condition.wait(self._blocked_until - now)
+                elif self.active >= int(self.limit):
+                    self._condition.wait()
+                elif self.rate and self._tokens < 1:
+                    self._condition.wait((1 - self._tokens) / self.rate)
+                else:
+                    if self.rate:
+                        self._tokens -= 1
+                    self.active += 1
+                    return
+
+    def release(self, throttled=False):
+        with self._condition:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def block(self, seconds):
+        """Don't start any request within the next ``seconds``"""
+        with self._condition:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self._condition.notify_all()
+
+
+class RequestScheduler():
+    """Schedules the requests of all adapters, shared per host.
+
+    Requests are limited per host by a HostLimiter. Rate limited responses (429, or 403 with an
+    exhausted X-RateLimit-Remaining) block the host for the time given in Retry-After or
+    X-RateLimit-Reset and are retried. Server errors and network errors are retried with
+    exponential backoff and jitter. After ``max_retries`` retries the last response is returned,
+    or the last network error is raised."""
+
+    max_delay = 300.0
+
+    def __init__(self, max_concurrency=8, rate=None, burst=10, max_retries=4, backoff=1.0):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._limiters = dict()
+        self._lock = threading.Lock()
+
+    def get_limiter(self, host):
+        with self._lock:
+            if host not in self._limiters:
+                self._limiters[host] = HostLimiter(self.max_concurrency, self.rate, self.burst)
+            return self._limiters[host]
+
+    def _backoff_delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.backoff * 2 ** attempt))
+
+    def execute(self, host, request):
+        """Execute ``request``, a function performing the request and returning an HTTPResponse,
+        respecting the limits of ``host``."""
+        limiter = self.get_limiter(host)
+        attempt = 0
+        while True:
+            limiter.acquire()
+            throttled = False
+            try:
+                response = request()
+            except OSError:
+                limiter.release()
+                if attempt >= self.max_retries:
+                    raise
+                stats.add('http %s' % host, retries=1)
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            delay = get_throttle_delay(response)
+            if delay is not None:
+                throttled = True
+                stats.add('http %s' % host, throttled=1)
+                limiter.block(min(self.max_delay, delay + self._backoff_delay(attempt)))
+            elif response.headers.get('X-RateLimit-Remaining') == '0':
+                # Not throttled yet, but the next request would be
+                reset_delay = _get_reset_delay(response.headers)
+                if reset_delay:
+                    limiter.block(min(self.max_delay, reset_delay))
+            limiter.release(throttled)
+
+            if attempt >= self.max_retries or not (throttled or response.status >= 500):
+                return response
+            if not throttled:
+                time.sleep(self._backoff_delay(attempt))
+            stats.add('http %s' % host, retries=1)
+            attempt += 1
@@ -0,0 +1,347 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import collections
+import concurrent.futures
+import hashlib
+import http.server
+import json
+import sys
+import threading
+import time
+import urllib.parse
+
+from helpers.checker import DistroChecker, aur_pkg_name_from_name
+from helpers.http import FetchError
+from helpers.report import TextReport
+from helpers.stats import stats
+
+
+# Sources in the order they are refreshed. Later sources depend on the earlier ones.
+SOURCES = ['installed', 'rosdistro', 'aur', 'github']
+
+# Categories that can be queried. Newly outdated packages only exist for incremental runs.
+CATEGORIES = [category for category, _ in TextReport.sections if category != 'newly_outdated']
+CATEGORIES.append('error')
+
+
+class GHSnapshot():
+    """Github information of all packages of a distribution, fetched at once and answered from
+    memory. Packages that could not be fetched raise the FetchError again on lookup."""
+
+    def __init__(self, gh_adapter, pkg_names, jobs=8):
+        self.infos = dict()
+        self.errors = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            for pkg_name, result in zip(pkg_names, executor.map(
+                    lambda pkg_name: self._fetch(gh_adapter, pkg_name), pkg_names)):
+                if isinstance(result, FetchError):
+                    self.errors[pkg_name] = result.message
+                else:
+                    self.infos[pkg_name] = result
+
+    @staticmethod
+    def _fetch(gh_adapter, pkg_name):
+        try:
+            return gh_adapter.get_package_info(pkg_name)
+        except FetchError as err:
+            return err
+
+    def get_package_info(self, pkg_name, known_info=None):
+        if pkg_name in self.errors:
+            raise FetchError(self.errors[pkg_name])
+        return self.infos.get(pkg_name)
+
+
+class Snapshot():
+    """Immutable classification of all packages. Successful responses are cached per path and
+    query, so repeated queries don't serialize anything. Only the most recently used
+    ``max_responses`` of them are kept."""
+
+    max_responses = 256
+
+    def __init__(self, generation, packages):
+        self.generation = generation
+        self.packages = packages
+        self.by_name = dict()
+        for entries in packages.values():
+            for entry in entries:
+                self.by_name.setdefault(entry['name'], list()).append(entry)
+                self.by_name.setdefault(entry['aur_name'], list()).append(entry)
+        self.responses = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_response(self, key):
+        with self._lock:
+            response = self.responses.get(key)
+            if response is not None:
+                self.responses.move_to_end(key)
+            return response
+
+    def add_response(self, key, response):
+        with self._lock:
+            self.responses[key] = response
+            if len(self.responses) > self.max_responses:
+                self.responses.popitem(last=False)
+
+
+class StatusService():
+    """Keeps all sources in memory and refreshes each of them on its own schedule.
+
+    ``loaders`` maps each source to the function loading it:
+     * installed() returns a PacmanDB
+     * rosdistro() returns a dictionary mapping each distribution to its package names, versions
+       and dependency graph, which may be None
+     * aur(aur_pkg_names) returns an AURAdapter
+     * github(distro_name, aur_pkg_names) returns a Github adapter
+
+    After every refresh all packages are classified again and published as a new Snapshot, so
+    queries never wait for a refresh. Sources depending on a refreshed source are reloaded as well
+    if the packages they were loaded for changed."""
+
+    def __init__(self, distro_names, loaders, intervals, pkg_filter, check_gh=True, jobs=8):
+        self.distro_names = distro_names
+        self.loaders = loaders
+        self.intervals = intervals
+        self.pkg_filter = pkg_filter
+        self.check_gh = check_gh
+        self.jobs = jobs
+        self._data = dict()
+        self._inputs = dict()
+        self._status = {source: {'interval': intervals.get(source), 'updated': None,
+                                 'error': None} for source in SOURCES}
+        self._next_refresh = dict.fromkeys(SOURCES, 0.0)
+        if not check_gh:
+            self._next_refresh['github'] = float('inf')
+        self._refresh_lock = threading.Lock()
+        self._snapshot = Snapshot(0, dict())
+
+    def _get_local_names(self):
+        return {distro_name: self.pkg_filter.filter_local(
+                    self._data['rosdistro'][distro_name][0], distro_name, self._data['installed'])
+                for distro_name in self.distro_names}
+
+    def _get_pkg_names(self):
+        return {distro_name: self.pkg_filter.filter_aur(pkg_names, distro_name, self._data['aur'])
+                for distro_name, pkg_names in self._get_local_names().items()}
+
+    @staticmethod
+    def _get_aur_names(pkg_names):
+        return {distro_name: [aur_pkg_name_from_name(pkg_name, distro_name)
+                              for pkg_name in names]
+                for distro_name, names in pkg_names.items()}
+
+    def _load(self, source):
+        if source == 'installed':
+            return self.loaders['installed'](), None
+        if source == 'rosdistro':
+            return self.loaders['rosdistro'](), None
+        if source == 'aur':
+            aur_names = self._get_aur_names(self._get_local_names())
+            return (self.loaders['aur']([name for names in aur_names.values() for name in names]),
+                    aur_names)
+        aur_names = self._get_aur_names(self._get_pkg_names())
+        return ({distro_name: GHSnapshot(self.loaders['github'](distro_name, names), names,
+                                         self.jobs)
+                 for distro_name, names in aur_names.items()},
+                aur_names)
+
+    def refresh(self, sources=SOURCES):
+        """Reload the given sources and classify all packages again. Failing sources keep their
+        previous data and the error is shown in the status, unless they were never loaded before.
+        The same applies to classifying the packages."""
+        with self._refresh_lock:
+            refreshed = list()
+            for source in SOURCES:
+                if source == 'github' and not self.check_gh:
+                    continue
+                if source not in sources and source in self._inputs:
+                    # reload dependent sources only if their packages changed
+                    if source == 'aur':
+                        aur_names = self._get_aur_names(self._get_local_names())
+                    else:
+                        aur_names = self._get_aur_names(self._get_pkg_names())
+                    if aur_names == self._inputs[source]:
+                        continue
+                elif source not in sources and source in self._data:
+                    continue
+
+                interval = self.intervals.get(source)
+                self._next_refresh[source] = (time.monotonic() + interval if interval
+                                              else float('inf'))
+                try:
+                    with stats.measure('serve.%s' % source):
+                        data, inputs = self._load(source)
+                except Exception as err:
+                    if source not in self._data:
+                        raise
+                    print("Refreshing %s failed: %s" % (source, err), file=sys.stderr)
+                    self._status[source]['error'] = str(err)
+                    continue
+                self._data[source] = data
+                if inputs is not None:
+                    self._inputs[source] = inputs
+                self._status[source]['updated'] = time.time()
+                self._status[source]['error'] = None
+                refreshed.append(source)
+
+            try:
+                self._classify()
+            except Exception as err:
+                if not self._snapshot.generation:
+                    raise
+                print("Classifying packages failed: %s" % err, file=sys.stderr)
+                for source in refreshed:
+                    self._status[source]['error'] = "Classifying packages failed: %s" % err
+
+    @stats.timed('serve.classify')
+    def _classify(self):
+        packages = dict()
+        for distro_name, pkg_names in self._get_pkg_names().items():
+            gh_adapter = self._data['github'][distro_name] if self.check_gh else None
+            checker = DistroChecker(distro_name, self._data['rosdistro'][distro_name][1],
+                                    self._data['aur'], gh_adapter, self._data['installed'],
+                                    check_gh=self.check_gh)
+            dependencies = self._data['rosdistro'][distro_name][2]
+            counts = dependencies.get_reverse_dependency_counts() if dependencies else None
+            entries = list()
+            for pkg_name in sorted(pkg_names):
+                pkg, categories = checker.check_package(pkg_name)
+                entry = pkg.to_dict()
+                entry['distro'] = distro_name
+                entry['aur_name'] = aur_pkg_name_from_name(pkg_name, distro_name)
+                entry['categories'] = sorted(categories)
+                if counts is not None:
+                    entry['dependents'] = counts.get(pkg_name, 0)
+                entries.append(entry)
+            packages[distro_name] = entries
+        self._snapshot = Snapshot(self._snapshot.generation + 1, packages)
+
+    def run(self, stop_event):
+        """Refresh every source once its interval elapsed, until stop_event is set"""
+        while not stop_event.is_set():
+            now = time.monotonic()
+            due = [source for source in SOURCES if self._next_refresh[source] <= now]
+            if due:
+                try:
+                    self.refresh(due)
+                except Exception as err:
+                    # only sources that were never loaded get here, they are retried on schedule
+                    print("Refreshing %s failed: %s" % (', '.join(due), err), file=sys.stderr)
+                continue
+            next_refresh = min(self._next_refresh.values())
+            stop_event.wait(next_refresh - now if next_refresh != float('inf') else None)
+
+    def get_status(self):
+        snapshot = self._snapshot
+        return {'generation': snapshot.generation,
+                'sources': {source: dict(status) for source, status in self._status.items()},
+                'counts': {distro_name: {category: sum(category in entry['categories']
+                                                       for entry in entries)
+                                         for category in CATEGORIES}
+                           for distro_name, entries in snapshot.packages.items()}}
+
+    def _query(self, snapshot, path, params):
+        parts = [part for part in path.split('/') if part]
+        distro_names = self.distro_names
+        if params.get('distro'):
+            distro_names = [name for value in params['distro'] for name in value.split(',')]
+            unknown = set(distro_names) - set(self.distro_names)
+            if unknown:
+                return 400, {'error': 'Unknown distribution %s' % ', '.join(sorted(unknown))}
+
+        if len(parts) == 2 and parts[0] == 'package':
+            entries = [entry for entry in snapshot.by_name.get(parts[1], list())
+                       if entry['distro'] in distro_names]
+            if not entries:
+                return 404, {'error': 'Unknown package %s' % parts[1]}
+            return 200, {'packages': entries}
+        if len(parts) == 1 and (parts[0] in CATEGORIES or parts[0] == 'packages'):
+            return 200, {'packages': [
+                entry for distro_name in distro_names
+                for entry in snapshot.packages.get(distro_name, list())
+                if parts[0] == 'packages' or parts[0] in entry['categories']]}
+        return 404, {'error': 'Unknown path %s' % path}
+
+    def get_response(self, url):
+        """Answer a request for ``url``. Returns the status code, the JSON body and its ETag."""
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.path.rstrip('/') == '/status':
+            return self._serialize(200, self.get_status())
+
+        snapshot = self._snapshot
+        key = (parsed.path, parsed.query)
+        response = snapshot.get_response(key)
+        if response is None:
+            status, document = self._query(snapshot, parsed.path,
+                                           urllib.parse.parse_qs(parsed.query))
+            response = self._serialize(status, document)
+            # errors aren't cached, every unknown path would be kept otherwise
+            if status == 200:
+                snapshot.add_response(key, response)
+        return response
+
+    @staticmethod
+    def _serialize(status, document):
+        body = json.dumps(document, sort_keys=True).encode('utf-8')
+        return status, body, '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+class StatusRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Answers GET requests from the StatusService of the server. Responses carry an ETag, so
+    clients polling with If-None-Match get an empty 304 response as long as nothing changed."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status, body, etag = self.server.service.get_response(self.path)
+        if_none_match = self.headers.get('If-None-Match', '')
+        if status == 200 and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Don't write an access log line per request
+        pass
+
+
+class StatusServer(http.server.ThreadingHTTPServer):
+    """HTTP server answering queries from a StatusService"""
+
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, StatusRequestHandler)
@@ -0,0 +1,92 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import os
+import sys
+import tempfile
+
+
+def get_state_dir():
+    """Returns the state directory of this tool following the XDG base directory specification"""
+    state_home = os.environ.get('XDG_STATE_HOME') or \
+        os.path.join(os.path.expanduser('~'), '.local', 'state')
+    return os.path.join(state_home, 'arch_ros_package_monitor')
+
+
+class StateStore():
+    """Per-package state of the last run, persisted as a JSON snapshot.
+
+    Each record holds the Github PKGBUILD information of a package and whether it was outdated.
+    The PKGBUILD is still revalidated on every run, but if its hash didn't change the stored
+    version is reused instead of parsing it again.
+
+    Without a previous state the run is a baseline: it only records the state, as otherwise every
+    outdated package would be reported as newly outdated."""
+
+    def __init__(self, path):
+        self.path = path
+        previous = self._load()
+        self.is_baseline = previous is None
+        self.previous = previous if previous is not None else dict()
+        self.current = dict()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except FileNotFoundError:
+            return None
+        except ValueError as err:
+            print("Ignoring unreadable state file %s: %s" % (self.path, err), file=sys.stderr)
+            return None
+
+    def get_gh_info(self, pkg_name):
+        """Returns the Github information stored for a package in the last run"""
+        record = self.previous.get(pkg_name, dict())
+        if record.get('gh_version') is None or record.get('gh_hash') is None:
+            return None
+        return {'name': pkg_name,
+                'version': record['gh_version'],
+                'pkgbuild_hash': record.get('gh_hash')}
+
+    def is_newly_outdated(self, pkg_name):
+        """Returns whether an outdated package was not outdated in the last run"""
+        if self.is_baseline:
+            return False
+        return not self.previous.get(pkg_name, dict()).get('outdated', False)
+
+    def update(self, pkg_name, record):
+        self.current[pkg_name] = record
+
+    def save(self):
+        """Write the state of the current run. Records of packages that were not checked in this
+        run are kept from the previous state."""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            json.dump(dict(self.previous, **self.current), tmp_file, separators=(',', ':'),
+                      sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,163 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import contextlib
+import functools
+import json
+import sys
+import threading
+import time
+
+
+class Stats():
+    """Thread-safe collection of per-stage measurements.
+
+    Each stage accumulates its number of calls and the wall time spent inside it, together with
+    arbitrary counters such as transferred bytes, retries or cache hits. As stages are executed by
+    multiple threads in parallel, the wall time of a stage is the sum over all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = dict()
+
+    def _get_stage(self, stage):
+        if stage not in self._stages:
+            self._stages[stage] = {'calls': 0, 'seconds': 0.0}
+        return self._stages[stage]
+
+    def add(self, stage, **counters):
+        with self._lock:
+            record = self._get_stage(stage)
+            for counter, value in counters.items():
+                record[counter] = record.get(counter, 0) + value
+
+    @contextlib.contextmanager
+    def measure(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, calls=1, seconds=time.perf_counter() - start)
+
+    def timed(self, stage):
+        """Decorator measuring every call of the decorated function as the given stage"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.measure(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def get(self):
+        with self._lock:
+            return {stage: dict(record) for stage, record in self._stages.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def format_table(self):
+        stages = self.get()
+        counters = sorted({counter for record in stages.values() for counter in record}
+                          - {'calls', 'seconds'})
+        lines = ['%-24s %8s %10s' % ('stage', 'calls', 'seconds')
+                 + ''.join(' %12s' % counter for counter in counters)]
+        for stage in sorted(stages):
+            record = stages[stage]
+            lines.append('%-24s %8i %10.3f' % (stage, record['calls'], record['seconds'])
+                         + ''.join(' %12i' % record.get(counter, 0) for counter in counters))
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as json_file:
+            json.dump(self.get(), json_file, indent=2, sort_keys=True)
+
+    def write_prometheus(self, path):
+        """Write the measurements in the Prometheus textfile collector format"""
+        lines = list()
+        for stage, record in sorted(self.get().items()):
+            for counter, value in sorted(record.items()):
+                lines.append('arch_ros_package_monitor_%s{stage="%s"} %s'
+                             % (counter, stage, repr(value)))
+        with open(path, 'w', encoding='utf-8') as prom_file:
+            prom_file.write('\n'.join(lines) + '\n')
+
+
+class ThreadProfiler():
+    """Collects cProfile data of the main thread and of functions run inside worker threads.
+    Before Python 3.12 cProfile only observes the thread it was enabled in, so every thread gets
+    its own profile which are merged when dumping. Since then cProfile is based on sys.monitoring,
+    which observes all threads but only allows a single active profile, the one of the main
+    thread."""
+
+    per_thread = sys.version_info < (3, 12)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = list()
+
+    def _get_profile(self):
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            import cProfile  # only needed when profiling
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def enable(self):
+        self._get_profile().enable()
+
+    def disable(self):
+        self._get_profile().disable()
+
+    def wrap(self, func):
+        """Returns a wrapper of func that profiles every call in the calling thread"""
+        if not self.per_thread:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = self._get_profile()
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+        return wrapper
+
+    def dump(self, path):
+        with self._lock:
+            profiles = list(self._profiles)
+        import pstats
+        merged = pstats.Stats(profiles[0], stream=sys.stderr)
+        for profile in profiles[1:]:
+            merged.add(profile)
+        merged.dump_stats(path)
+
+
+stats = Stats()
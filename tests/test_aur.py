@@ -0,0 +1,204 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+import unittest.mock
+import urllib.parse
+
+from helpers.aur import AURAdapter, iter_json_array
+from helpers.cache import CachedHTTPClient
+from helpers.http import FetchError, HTTPClient
+from tests.local_server import LocalServer
+
+AUR_PACKAGES = {'ros-noetic-%s' % name: {'Name': 'ros-noetic-%s' % name, 'Version': '1.0.%i-1' % i,
+                                         'Maintainer': 'someone', 'LastModified': 1600000000 + i,
+                                         'Description': 'not kept'}
+                for i, name in enumerate(['roscpp', 'rospy', 'catkin', 'rviz', 'tf2', 'gazebo-ros',
+                                          'image-transport', 'nav-msgs', 'std-msgs', 'urdf'])}
+
+
+def serve_rpc(path, params, headers):
+    if params.get('arg[]') == ['ros-noetic-error']:
+        return 200, json.dumps({'type': 'error', 'error': 'Too many package results.',
+                                'resultcount': 0, 'results': []}).encode('utf-8')
+    results = [AUR_PACKAGES[name] for name in params.get('arg[]', list()) if name in AUR_PACKAGES]
+    return 200, json.dumps({'type': 'multiinfo', 'resultcount': len(results),
+                            'results': results}).encode('utf-8')
+
+
+DUMP = gzip.compress(json.dumps(
+    list(AUR_PACKAGES.values()) + [{'Name': 'ros-melodic-roscpp', 'Version': '1.14.0-1'},
+                                   {'Name': 'python-rosdistro', 'Version': '0.9.0-1'}]
+).encode('utf-8'))
+DUMP_ETAG = '"dump"'
+
+
+def serve_dump(path, params, headers):
+    if path != '/packages-meta-v1.json.gz':
+        return 404, b''
+    if headers.get('If-None-Match') == DUMP_ETAG:
+        return 304, b''
+    return 200, DUMP, {'ETag': DUMP_ETAG}
+
+
+class IterJSONArrayTest(unittest.TestCase):
+
+    def decode(self, text, chunk_size=3):
+        return list(iter_json_array(io.StringIO(text), chunk_size))
+
+    def test_elements_across_chunks(self):
+        elements = [{'Name': 'ros-noetic-roscpp', 'Depends': ['a', 'b']}, 'text, with ]', 12,
+                    -3.5, None, True, [1, [2]]]
+        text = json.dumps(elements)
+        for chunk_size in (1, 2, 3, 7, 64 * 1024):
+            self.assertEqual(self.decode(text, chunk_size), elements)
+
+    def test_numbers(self):
+        self.assertEqual(self.decode('[12345, 678]'), [12345, 678])
+        self.assertEqual(self.decode('[\n 12345\n]'), [12345])
+
+    def test_empty(self):
+        self.assertEqual(self.decode('[]'), [])
+        self.assertEqual(self.decode(' [ ] '), [])
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            self.decode('[{"Name": "ros-noetic-roscpp"}, {"Name": "ros')
+
+
+class InfoURLsTest(unittest.TestCase):
+
+    def get_names(self, url):
+        return urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)['arg[]']
+
+    def test_single_chunk(self):
+        urls = AURAdapter.get_info_urls(['ros-noetic-b', 'ros-noetic-a', 'ros-noetic-b'])
+        self.assertEqual(len(urls), 1)
+        self.assertEqual(self.get_names(urls[0]), ['ros-noetic-a', 'ros-noetic-b'])
+
+    def test_no_names(self):
+        self.assertEqual(AURAdapter.get_info_urls([]), [])
+
+    def test_chunks_respect_max_url_length(self):
+        pkg_names = ['ros-noetic-package-%i' % i for i in range(1000)]
+        urls = AURAdapter.get_info_urls(pkg_names)
+        self.assertGreater(len(urls), 1)
+        for url in urls:
+            self.assertLessEqual(len(url), AURAdapter.max_url_length)
+        self.assertEqual([name for url in urls for name in self.get_names(url)],
+                         sorted(pkg_names))
+
+    def test_names_are_quoted(self):
+        urls = AURAdapter.get_info_urls(['ros-noetic-a+b'])
+        self.assertIn('arg%5B%5D=ros-noetic-a%2Bb', urls[0])
+        self.assertEqual(self.get_names(urls[0]), ['ros-noetic-a+b'])
+
+
+class MultiinfoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(serve_rpc).__enter__()
+        self.addCleanup(self.server.__exit__)
+        patcher = unittest.mock.patch.object(AURAdapter, 'aur_api_url',
+                                             self.server.url + '/rpc?v=5')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        pkg_names = list(AUR_PACKAGES) + ['ros-noetic-missing', 'ros-noetic-roscpp']
+        with unittest.mock.patch.object(AURAdapter, 'max_url_length', 150):
+            adapter = AURAdapter('noetic', HTTPClient(), pkg_names, jobs=4)
+        self.assertGreater(len(self.server.requests), 1)
+        self.assertEqual(set(adapter.packages), set(AUR_PACKAGES))
+        pkg = adapter.get_package_info('ros-noetic-roscpp')
+        self.assertEqual(pkg['Version'], '1.0.0-1')
+        self.assertNotIn('Description', pkg)
+        self.assertIsNone(adapter.get_package_info('ros-noetic-missing'))
+
+    def test_error_response(self):
+        with self.assertRaises(FetchError):
+            AURAdapter('noetic', HTTPClient(), ['ros-noetic-error'])
+
+    def test_bulk_lookup(self):
+        adapter = AURAdapter('noetic', HTTPClient(), list(AUR_PACKAGES))
+        pkg_names = ['ros-noetic-roscpp', 'ros-noetic-rviz', 'ros-noetic-missing']
+        self.assertEqual(set(adapter.get_package_infos(pkg_names)),
+                         {'ros-noetic-roscpp', 'ros-noetic-rviz'})
+        self.assertEqual(adapter.get_missing_names(pkg_names), {'ros-noetic-missing'})
+        self.assertEqual(adapter.get_unknown_names(pkg_names),
+                         set(AUR_PACKAGES) - {'ros-noetic-roscpp', 'ros-noetic-rviz'})
+
+
+class DumpTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(serve_dump).__enter__()
+        self.addCleanup(self.server.__exit__)
+        patcher = unittest.mock.patch.object(AURAdapter, 'aur_dump_url',
+                                             self.server.url + '/packages-meta-v1.json.gz')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.dump_dir = os.path.join(self.tmp_dir, 'aur')
+
+    def test_dump(self):
+        adapter = AURAdapter('noetic', HTTPClient(), use_dump=True, dump_dir=self.dump_dir)
+        self.assertEqual(set(adapter.packages), set(AUR_PACKAGES))
+        self.assertNotIn('Description', adapter.get_package_info('ros-noetic-roscpp'))
+
+        # unchanged dumps are not downloaded again
+        adapter = AURAdapter(['noetic', 'melodic'], HTTPClient(), use_dump=True,
+                             dump_dir=self.dump_dir)
+        self.assertEqual(self.server.requests, ['/packages-meta-v1.json.gz'] * 2)
+        self.assertEqual(set(adapter.packages), set(AUR_PACKAGES) | {'ros-melodic-roscpp'})
+
+    def test_offline(self):
+        http_client = CachedHTTPClient(cache_dir=os.path.join(self.tmp_dir, 'http'),
+                                       offline=True)
+        with self.assertRaises(FetchError):
+            AURAdapter('noetic', http_client, use_dump=True, dump_dir=self.dump_dir)
+        AURAdapter('noetic', HTTPClient(), use_dump=True, dump_dir=self.dump_dir)
+        adapter = AURAdapter('noetic', http_client, use_dump=True, dump_dir=self.dump_dir)
+        self.assertEqual(set(adapter.packages), set(AUR_PACKAGES))
+
+    def test_corrupt_dump(self):
+        os.makedirs(self.dump_dir)
+        with open(os.path.join(self.dump_dir, 'packages-meta-v1.json.gz'), 'wb') as dump:
+            dump.write(b'not gzipped')
+        http_client = CachedHTTPClient(cache_dir=os.path.join(self.tmp_dir, 'http'),
+                                       offline=True)
+        with self.assertRaises(FetchError):
+            AURAdapter('noetic', http_client, use_dump=True, dump_dir=self.dump_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
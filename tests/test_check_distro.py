@@ -0,0 +1,151 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from helpers.aur import AURAdapter
+from helpers.fixtures import FixtureBundle
+from helpers.github import GHAdapter
+from helpers.report import CSVSink
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# rosdistro version, AUR version and Github version of the packages in the fixture bundle
+PACKAGES = {
+    'roscpp': ('1.15.8', '1.15.8-1', '1.15.8'),
+    'rospy': ('1.15.9', '1.15.8-1', '1.15.8'),
+    'catkin': ('0.8.9', None, None),
+    'rviz': ('1.14.4', '1.14.4-1', '1.14.5'),
+}
+
+
+def make_bundle(path, packages=PACKAGES, distro_name='noetic'):
+    """Generate a fixture bundle of one distribution with the given packages"""
+    bundle = FixtureBundle(path)
+    bundle.store_rosdistro(distro_name, list(packages),
+                           {pkg_name: versions[0] for pkg_name, versions in packages.items()})
+    bundle.store_pacman(dict())
+    gh_adapter = GHAdapter(distro_name)
+    aur_results = list()
+    for pkg_name, (_, aur_version, gh_version) in packages.items():
+        aur_pkg_name = 'ros-%s-%s' % (distro_name, pkg_name.replace('_', '-'))
+        if aur_version:
+            aur_results.append({'Name': aur_pkg_name, 'Version': aur_version,
+                                'Maintainer': 'someone', 'LastModified': 1600000000})
+        pkgbuild_url = '/'.join([gh_adapter.repo_base_url, aur_pkg_name, 'master/PKGBUILD'])
+        if gh_version:
+            bundle.store_response(pkgbuild_url, 200, dict(), (
+                "pkgname='%s'\npkgver='%s'\npkgrel=1\n" % (aur_pkg_name, gh_version)
+            ).encode('utf-8'))
+        else:
+            bundle.store_response(pkgbuild_url, 404, dict(), b'')
+    bundle.store_response(AURAdapter.get_search_url('ros-%s-' % distro_name), 200, dict(),
+                          json.dumps({'resultcount': len(aur_results),
+                                      'results': aur_results}).encode('utf-8'))
+    return bundle
+
+
+class CheckDistroTest(unittest.TestCase):
+    """Runs check_distro.py in replay mode against a generated fixture bundle"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.bundle_path = os.path.join(self.tmp_dir, 'bundle')
+        make_bundle(self.bundle_path)
+
+    def run_check_distro(self, *args, replay=True):
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(self.tmp_dir, 'cache'),
+                   XDG_STATE_HOME=os.path.join(self.tmp_dir, 'state'))
+        if replay:
+            args = ('--replay', self.bundle_path) + args
+        result = subprocess.run(
+            [sys.executable, os.path.join(REPO_DIR, 'check_distro.py'), '--distro_name', 'noetic']
+            + list(args),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, check=False)
+        return result.returncode, result.stdout.decode('utf-8'), result.stderr.decode('utf-8')
+
+    def get_categories(self, *args):
+        """Run with JSON lines output and return the categories of every package"""
+        status, stdout, stderr = self.run_check_distro('--format', 'jsonl', *args)
+        self.assertEqual(status, 0, stderr)
+        return {record['name']: set(record['categories'])
+                for record in map(json.loads, stdout.splitlines())}
+
+    def test_categories(self):
+        self.assertEqual(self.get_categories(), {'rospy': {'outdated'}, 'catkin': {'missing'},
+                                                 'rviz': {'outofsync'}})
+
+    def test_machine_readable_output(self):
+        # messages about unparsable PKGBUILDs must not end up between the records
+        FixtureBundle(self.bundle_path).store_response(
+            '/'.join([GHAdapter('noetic').repo_base_url, 'ros-noetic-rviz', 'master/PKGBUILD']),
+            200, dict(), b"pkgname='ros-noetic-rviz'\n")
+        self.assertEqual(self.get_categories(), {'rospy': {'outdated'}, 'catkin': {'missing'}})
+        status, stdout, stderr = self.run_check_distro('--format', 'csv')
+        self.assertEqual(status, 0, stderr)
+        self.assertEqual(stdout.splitlines()[0], ','.join(CSVSink.fields))
+        self.assertEqual(len(stdout.splitlines()), 3)
+        self.assertIn('Could not parse GH version', stderr)
+
+    def test_incremental(self):
+        # the first run is the baseline
+        self.assertEqual(self.get_categories('--incremental'),
+                         {'rospy': {'outdated'}, 'catkin': {'missing'}, 'rviz': {'outofsync'}})
+        self.assertEqual(self.get_categories('--incremental'),
+                         {'rospy': {'outdated'}, 'catkin': {'missing'}, 'rviz': {'outofsync'}})
+
+        packages = dict(PACKAGES, rviz=('1.14.5', '1.14.4-1', '1.14.5'),
+                        roscpp=('1.15.8', '1.15.8-1', '1.15.9'))
+        make_bundle(self.bundle_path, packages)
+        self.assertEqual(self.get_categories('--incremental'),
+                         {'rospy': {'outdated'}, 'catkin': {'missing'},
+                          'rviz': {'outdated', 'newly_outdated', 'outofsync'},
+                          'roscpp': {'outofsync'}})
+
+    def test_offline_without_snapshot(self):
+        status, _, stderr = self.run_check_distro('--offline', replay=False)
+        self.assertEqual(status, 1)
+        self.assertIn('There is no snapshot of the distribution noetic', stderr)
+        self.assertNotIn('Traceback', stderr)
+
+    def test_profile(self):
+        profile_path = os.path.join(self.tmp_dir, 'profile')
+        status, _, stderr = self.run_check_distro('--jobs', '4', '--profile', profile_path)
+        self.assertEqual(status, 0, stderr)
+        functions = {function for _, _, function in pstats.Stats(profile_path).stats}
+        self.assertIn('check_package', functions)
+        self.assertIn('get_package_info', functions)
+
+
+if __name__ == '__main__':
+    unittest.main()
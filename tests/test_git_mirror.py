@@ -0,0 +1,109 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+import unittest.mock
+
+from helpers.git_mirror import GitMirrorAdapter
+from helpers.http import FetchError
+
+
+@unittest.skipUnless(shutil.which('git'), 'git is not installed')
+class GitMirrorAdapterTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.org_dir = os.path.join(self.tmp_dir, 'ros-noetic-arch')
+        self.mirror_dir = os.path.join(self.tmp_dir, 'mirror')
+        self.push_pkgbuild('ros-noetic-roscpp', '1.15.8')
+        self.push_pkgbuild('ros-noetic-rospy', '1.15.9')
+
+    def git(self, *args):
+        subprocess.run(['git', '-c', 'user.name=test', '-c', 'user.email=test@localhost']
+                       + list(args), check=True, stdout=subprocess.DEVNULL)
+
+    def push_pkgbuild(self, pkg_name, version):
+        """Commit a PKGBUILD with the given version to the master branch of a bare repository"""
+        repo_dir = os.path.join(self.org_dir, pkg_name)
+        work_dir = os.path.join(self.tmp_dir, 'work', pkg_name)
+        if not os.path.exists(repo_dir):
+            self.git('init', '--quiet', '--bare', repo_dir)
+            self.git('init', '--quiet', work_dir)
+        with open(os.path.join(work_dir, 'PKGBUILD'), 'w', encoding='utf-8') as pkgbuild:
+            pkgbuild.write("pkgname='%s'\npkgver='%s'\npkgrel=1\n" % (pkg_name, version))
+        self.git('-C', work_dir, 'add', 'PKGBUILD')
+        self.git('-C', work_dir, 'commit', '--quiet', '-m', version)
+        self.git('-C', work_dir, 'push', '--quiet', repo_dir, 'HEAD:refs/heads/master')
+
+    def make_adapter(self, repo_base_url=None, offline=False):
+        return GitMirrorAdapter('noetic', self.mirror_dir, repo_base_url or self.org_dir,
+                                offline=offline)
+
+    def test_fetch(self):
+        infos = self.make_adapter().get_package_infos(
+            ['ros-noetic-roscpp', 'ros-noetic-rospy', 'ros-noetic-unknown'], jobs=2)
+        self.assertEqual(infos['ros-noetic-roscpp']['version'], '1.15.8')
+        self.assertEqual(infos['ros-noetic-rospy']['version'], '1.15.9')
+        self.assertIsNone(infos['ros-noetic-unknown'])
+
+    def test_new_commits(self):
+        self.make_adapter().get_package_infos(['ros-noetic-roscpp'])
+        self.push_pkgbuild('ros-noetic-roscpp', '1.16.0')
+        self.assertEqual(self.make_adapter().get_package_info('ros-noetic-roscpp')['version'],
+                         '1.16.0')
+
+    def test_offline(self):
+        self.make_adapter().get_package_infos(['ros-noetic-roscpp'])
+        self.push_pkgbuild('ros-noetic-roscpp', '1.16.0')
+        adapter = self.make_adapter(offline=True)
+        self.assertEqual(adapter.get_package_info('ros-noetic-roscpp')['version'], '1.15.8')
+        self.assertIsNone(adapter.get_package_info('ros-noetic-rospy'))
+
+    def test_fetch_failure_uses_previous_fetch(self):
+        self.make_adapter().get_package_infos(['ros-noetic-roscpp'])
+        adapter = self.make_adapter('unreachable://github.com/ros-noetic-arch')
+        self.assertEqual(adapter.get_package_info('ros-noetic-roscpp')['version'], '1.15.8')
+
+    def test_fetch_failure_without_previous_fetch(self):
+        adapter = self.make_adapter('unreachable://github.com/ros-noetic-arch')
+        self.assertEqual(adapter.get_package_infos(['ros-noetic-roscpp']), dict())
+        with self.assertRaises(FetchError):
+            adapter.get_package_info('ros-noetic-roscpp')
+
+    def test_git_not_installed(self):
+        adapter = self.make_adapter()
+        with unittest.mock.patch.dict(os.environ, {'PATH': self.tmp_dir}):
+            with self.assertRaises(FetchError):
+                adapter.get_package_info('ros-noetic-roscpp')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time
+import unittest
+
+from helpers.github import GHAdapter
+from helpers.http import FetchError, HTTPClient
+from tests.local_server import LocalServer
+
+PKGBUILDS = {
+    '/ros-noetic-arch/ros-noetic-roscpp/master/PKGBUILD': b"pkgname='ros-noetic-roscpp'\n"
+                                                          b"pkgver='1.15.8'\npkgrel=1\n",
+    '/ros-noetic-arch/ros-noetic-broken/master/PKGBUILD': b"pkgname='ros-noetic-broken'\n",
+}
+
+
+def serve_pkgbuild(path, params, headers):
+    if path in PKGBUILDS:
+        return 200, PKGBUILDS[path]
+    if 'failing' in path:
+        return 502, b'Bad Gateway'
+    return 404, b'Not Found'
+
+
+class GHAdapterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = LocalServer(serve_pkgbuild).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.adapter = GHAdapter('noetic', HTTPClient(),
+                                 repo_base_url=self.server.url + '/ros-noetic-arch')
+
+    def test_parses_version(self):
+        pkg = self.adapter.get_package_info('ros-noetic-roscpp')
+        self.assertEqual(pkg['name'], 'ros-noetic-roscpp')
+        self.assertEqual(pkg['version'], '1.15.8')
+        self.assertEqual(len(pkg['pkgbuild_hash']), 40)
+
+    def test_missing_repository(self):
+        self.assertIsNone(self.adapter.get_package_info('ros-noetic-unknown'))
+
+    def test_server_error(self):
+        with self.assertRaises(FetchError):
+            self.adapter.get_package_info('ros-noetic-failing')
+
+    def test_network_error(self):
+        adapter = GHAdapter('noetic', HTTPClient(), repo_base_url='http://127.0.0.1:1')
+        with self.assertRaises(FetchError):
+            adapter.get_package_info('ros-noetic-roscpp')
+
+    def test_unparsable_pkgbuild(self):
+        self.assertIsNone(self.adapter.get_package_info('ros-noetic-broken'))
+
+    def test_known_info_is_reused(self):
+        pkg = self.adapter.get_package_info('ros-noetic-roscpp')
+        self.assertIs(self.adapter.get_package_info('ros-noetic-roscpp', pkg), pkg)
+        outdated = dict(pkg, pkgbuild_hash='0' * 40, version='1.0.0')
+        self.assertEqual(self.adapter.get_package_info('ros-noetic-roscpp', outdated), pkg)
+
+    def test_batch(self):
+        infos = self.adapter.get_package_infos(['ros-noetic-roscpp', 'ros-noetic-unknown'], jobs=2)
+        self.assertEqual(infos['ros-noetic-roscpp']['version'], '1.15.8')
+        self.assertIsNone(infos['ros-noetic-unknown'])
+        with self.assertRaises(FetchError):
+            self.adapter.get_package_infos(['ros-noetic-roscpp', 'ros-noetic-failing'], jobs=2)
+
+
+class ConcurrencyTest(unittest.TestCase):
+    """Fetches from a server answering every request after a delay"""
+
+    delay = 0.1
+
+    def serve_delayed(self, path, params, headers):
+        time.sleep(self.delay)
+        return 200, b"pkgver=1.0.0\n"
+
+    def test_concurrent_fetches(self):
+        count = 24
+        jobs = 4
+        pkg_names = ['ros-noetic-pkg-%i' % i for i in range(count)]
+        with LocalServer(self.serve_delayed) as server:
+            adapter = GHAdapter('noetic', HTTPClient(), repo_base_url=server.url)
+            start = time.monotonic()
+            infos = adapter.get_package_infos(pkg_names, jobs=jobs)
+            elapsed = time.monotonic() - start
+        self.assertEqual({info['version'] for info in infos.values()}, {'1.0.0'})
+        self.assertEqual(len(server.requests), count)
+        # about count / jobs rounds of requests, serial fetches would take count * delay
+        self.assertGreaterEqual(elapsed, count / jobs * self.delay * 0.9)
+        self.assertLess(elapsed, count / jobs * self.delay * 2)
+        # every worker keeps its connection alive
+        self.assertLessEqual(server.connections, jobs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import itertools
+import unittest
+
+from helpers.package import Package, Version, VersionParsingException, vercmp
+from helpers.pacman import PacmanDB
+
+# Test vectors of pacman's vercmptest.sh: version a, version b and the expected result of vercmp
+VERCMP_VECTORS = [
+    # all similar length, no pkgrel
+    ('1.5.0', '1.5.0', 0),
+    ('1.5.1', '1.5.0', 1),
+    # mixed length
+    ('1.5.1', '1.5', 1),
+    # with pkgrel, simple
+    ('1.5.0-1', '1.5.0-1', 0),
+    ('1.5.0-1', '1.5.0-2', -1),
+    ('1.5.0-1', '1.5.1-1', -1),
+    ('1.5.0-2', '1.5.1-1', -1),
+    # with pkgrel, mixed lengths
+    ('1.5-1', '1.5.1-1', -1),
+    ('1.5-2', '1.5.1-1', -1),
+    ('1.5-2', '1.5.1-2', -1),
+    # mixed pkgrel inclusion
+    ('1.5', '1.5-1', 0),
+    ('1.5-1', '1.5', 0),
+    ('1.1-1', '1.1', 0),
+    ('1.0-1', '1.1', -1),
+    ('1.1-1', '1.0', 1),
+    # alphanumeric versions
+    ('1.5b-1', '1.5-1', -1),
+    ('1.5b', '1.5', -1),
+    ('1.5b-1', '1.5', -1),
+    ('1.5b', '1.5.1', -1),
+    # from the manpage
+    ('1.0a', '1.0alpha', -1),
+    ('1.0alpha', '1.0b', -1),
+    ('1.0b', '1.0beta', -1),
+    ('1.0beta', '1.0rc', -1),
+    ('1.0rc', '1.0', -1),
+    # alpha-dotted versions
+    ('1.5.a', '1.5', 1),
+    ('1.5.b', '1.5.a', 1),
+    ('1.5.1', '1.5.b', 1),
+    # alpha dots and dashes
+    ('1.5.b-1', '1.5.b', 0),
+    ('1.5-1', '1.5.b', -1),
+    # same/similar content, differing separators
+    ('2.0', '2_0', 0),
+    ('2.0_a', '2_0.a', 0),
+    ('2.0a', '2.0.a', -1),
+    ('2___a', '2_a', 1),
+    # epoch included version comparisons
+    ('0:1.0', '0:1.0', 0),
+    ('0:1.0', '0:1.1', -1),
+    ('1:1.0', '0:1.0', 1),
+    ('1:1.0', '0:1.1', 1),
+    ('1:1.0', '2:1.1', -1),
+    # epoch + sometimes present pkgrel
+    ('1:1.0', '0:1.0-1', 1),
+    ('1:1.0-1', '0:1.1-1', 1),
+    # epoch included on one version
+    ('0:1.0', '1.0', 0),
+    ('0:1.0', '1.1', -1),
+    ('0:1.1', '1.0', 1),
+    ('1:1.0', '1.0', 1),
+    ('1:1.0', '1.1', 1),
+    ('1:1.1', '1.1', 1),
+]
+
+
+class VercmpTest(unittest.TestCase):
+
+    def test_vectors(self):
+        for version_a, version_b, expected in VERCMP_VECTORS:
+            self.assertEqual(vercmp(version_a, version_b), expected, (version_a, version_b))
+            self.assertEqual(vercmp(version_b, version_a), -expected, (version_b, version_a))
+
+    def test_versions(self):
+        self.assertEqual(vercmp(Version('1.2.3'), '1.2.3-2'), 0)
+
+    def test_invalid(self):
+        with self.assertRaises(TypeError):
+            vercmp(None, '1.0')
+        with self.assertRaises(VersionParsingException):
+            vercmp('...', '1.0')
+
+
+class VersionTest(unittest.TestCase):
+
+    def test_interned(self):
+        self.assertIs(Version('1.2.3-1'), Version('1.2.3-1'))
+
+    def test_pkgrel_order(self):
+        self.assertLess(Version('1.2.3'), Version('1.2.3-1'))
+        self.assertLess(Version('1.2.3-1'), Version('1.2.3-2'))
+        self.assertNotEqual(Version('1.2.3'), Version('1.2.3-1'))
+        self.assertEqual(Version('1.2.3-1'), Version('0:1.2.3-1'))
+        self.assertEqual(len({Version('1.2.3-1'), Version('1.2.3'), Version('1.2.3-2')}), 3)
+
+    def test_total_order(self):
+        versions = [Version(version) for vector in VERCMP_VECTORS for version in vector[:2]]
+        for version_a, version_b in itertools.product(versions, repeat=2):
+            if version_a == version_b:
+                self.assertEqual(hash(version_a), hash(version_b))
+            self.assertEqual(sum([version_a < version_b, version_a == version_b,
+                                  version_a > version_b]), 1)
+        for permutation in itertools.permutations(['1.2.3-1', '1.2.3', '1.2.3-2']):
+            self.assertEqual([str(version) for version in sorted(map(Version, permutation))],
+                             ['1.2.3', '1.2.3-1', '1.2.3-2'])
+        ordered = sorted(versions)
+        for version_a, version_b in zip(ordered, ordered[1:]):
+            self.assertLessEqual(version_a, version_b)
+            for version_c in ordered[ordered.index(version_b):]:
+                self.assertLessEqual(version_a, version_c)
+
+
+class PackageTest(unittest.TestCase):
+
+    def make_package(self, rosdistro, aur, github=None):
+        pkg = Package('roscpp', pacman_db=PacmanDB(packages=dict()))
+        pkg.add_rosdistro_version(rosdistro)
+        pkg.add_aur_information({'Name': 'ros-noetic-roscpp', 'Version': aur,
+                                 'Maintainer': 'someone'})
+        if github:
+            pkg.add_gh_information({'version': github})
+        return pkg
+
+    def test_pkgrel_is_ignored_against_rosdistro(self):
+        pkg = self.make_package('1.15.8', '1.15.8-2', '1.15.8')
+        self.assertFalse(pkg.is_outdated())
+        self.assertFalse(pkg.is_ahead())
+        self.assertFalse(pkg.is_outofsync())
+
+    def test_outdated(self):
+        self.assertTrue(self.make_package('1.15.9', '1.15.8-2').is_outdated())
+        self.assertTrue(self.make_package('1.15.8', '1.15.9-1').is_ahead())
+        self.assertTrue(self.make_package('1.15.8', '1.15.8-1', '1.15.9').is_outofsync())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os
+import tempfile
+import unittest
+
+from helpers.pacman import PacmanDB, parse_desc
+
+DESC = """%%NAME%%
+%s
+
+%%VERSION%%
+%s
+
+%%BASE%%
+%s
+
+%%DESC%%
+Package with %%VERSION%% in its description
+
+%%ARCH%%
+x86_64
+
+%%DEPENDS%%
+ros-noetic-roscpp
+"""
+
+
+class PacmanDBTest(unittest.TestCase):
+    """Reads a local database fixture laid out like /var/lib/pacman"""
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.db_path = tmp_dir.name
+        local_dir = os.path.join(self.db_path, 'local')
+        os.makedirs(local_dir)
+        with open(os.path.join(local_dir, 'ALPM_DB_VERSION'), 'w', encoding='utf-8') as version:
+            version.write('9\n')
+        self.add_package('ros-noetic-roscpp', '1.15.8-1')
+        self.add_package('ros-noetic-rviz', '1:1.14.4-2')
+        self.add_package('python-rosdistro', '0.9.0-1')
+        # incomplete entries are skipped
+        os.makedirs(os.path.join(local_dir, 'ros-noetic-partial-1.0.0-1'))
+        os.makedirs(os.path.join(local_dir, 'ros-noetic-broken-1.0.0-1'))
+        with open(os.path.join(local_dir, 'ros-noetic-broken-1.0.0-1', 'desc'), 'w',
+                  encoding='utf-8') as desc:
+            desc.write('%NAME%\nros-noetic-broken\n')
+
+    def add_package(self, name, version):
+        pkg_dir = os.path.join(self.db_path, 'local', '%s-%s' % (name, version.split(':')[-1]))
+        os.makedirs(pkg_dir)
+        with open(os.path.join(pkg_dir, 'desc'), 'w', encoding='utf-8') as desc:
+            desc.write(DESC % (name, version, name))
+        with open(os.path.join(pkg_dir, 'files'), 'w', encoding='utf-8') as files:
+            files.write('%FILES%\nopt/\n')
+
+    def test_parse_desc(self):
+        path = os.path.join(self.db_path, 'local', 'ros-noetic-rviz-1.14.4-2', 'desc')
+        self.assertEqual(parse_desc(path), ('ros-noetic-rviz', '1:1.14.4-2'))
+
+    def test_snapshot(self):
+        pacman_db = PacmanDB(self.db_path)
+        self.assertEqual(pacman_db.packages, {'ros-noetic-roscpp': '1.15.8-1',
+                                              'ros-noetic-rviz': '1:1.14.4-2',
+                                              'python-rosdistro': '0.9.0-1'})
+        self.assertEqual(pacman_db.get_installed_version('ros-noetic-rviz'), '1:1.14.4-2')
+        self.assertTrue(pacman_db.is_installed('ros-noetic-roscpp'))
+        self.assertFalse(pacman_db.is_installed('ros-noetic-broken'))
+        self.assertIsNone(pacman_db.get_installed_version('ros-noetic-catkin'))
+
+    def test_empty_db(self):
+        with tempfile.TemporaryDirectory() as db_path:
+            self.assertEqual(PacmanDB(db_path).packages, dict())
+
+
+if __name__ == '__main__':
+    unittest.main()
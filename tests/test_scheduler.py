@@ -0,0 +1,204 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import concurrent.futures
+import email.utils
+import threading
+import time
+import unittest
+
+from helpers.http import HTTPClient
+from helpers.scheduler import HostLimiter, RequestScheduler, _parse_retry_after
+from tests.local_server import LocalServer
+
+
+class ScriptedServer(LocalServer):
+    """Answers the requests with the given responses in order, repeating the last one"""
+
+    def __init__(self, responses):
+        super().__init__(self.answer)
+        self.responses = list(responses)
+        self.times = list()
+
+    def answer(self, path, params, headers):
+        self.times.append(time.monotonic())
+        if len(self.responses) > 1:
+            return self.responses.pop(0)
+        return self.responses[0]
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def get(self, responses, max_retries=3, **kwargs):
+        """Request a URL from a server answering with ``responses``. Returns the response, the
+        server and the elapsed time."""
+        scheduler = RequestScheduler(max_retries=max_retries, backoff=0.01, **kwargs)
+        with ScriptedServer(responses) as server:
+            start = time.monotonic()
+            response = HTTPClient(scheduler=scheduler).get(server.url + '/rpc')
+            return response, server, time.monotonic() - start
+
+    def test_retry_after(self):
+        response, server, elapsed = self.get([(429, b'', {'Retry-After': '0.3'}), (200, b'ok')])
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.body, b'ok')
+        self.assertEqual(len(server.requests), 2)
+        self.assertGreaterEqual(server.times[1] - server.times[0], 0.3)
+
+    def test_rate_limit_exhausted(self):
+        reset = '%.3f' % (time.time() + 0.3)
+        response, server, _ = self.get([
+            (403, b'', {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}),
+            (200, b'ok')])
+        self.assertEqual(response.status, 200)
+        self.assertGreaterEqual(server.times[1] - server.times[0], 0.25)
+
+    def test_forbidden_is_not_retried(self):
+        response, server, _ = self.get([(403, b'', {'X-RateLimit-Remaining': '10'})])
+        self.assertEqual(response.status, 403)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_last_remaining_request_blocks_host(self):
+        reset = '%.3f' % (time.time() + 0.3)
+        scheduler = RequestScheduler(backoff=0.01)
+        http_client = HTTPClient(scheduler=scheduler)
+        with ScriptedServer([(200, b'', {'X-RateLimit-Remaining': '0',
+                                         'X-RateLimit-Reset': reset}), (200, b'')]) as server:
+            http_client.get(server.url + '/first')
+            http_client.get(server.url + '/second')
+        self.assertGreaterEqual(server.times[1] - server.times[0], 0.25)
+
+    def test_server_error_is_retried(self):
+        response, server, _ = self.get([(502, b''), (503, b''), (200, b'ok')])
+        self.assertEqual(response.status, 200)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_persistent_server_error(self):
+        response, server, _ = self.get([(503, b'')], max_retries=2)
+        self.assertEqual(response.status, 503)
+        self.assertEqual(len(server.requests), 3)
+
+    def test_client_error_is_not_retried(self):
+        response, server, _ = self.get([(404, b'')])
+        self.assertEqual(response.status, 404)
+        self.assertEqual(len(server.requests), 1)
+
+    def test_network_error(self):
+        scheduler = RequestScheduler(max_retries=2, backoff=0.01)
+        with LocalServer(None) as server:
+            url = server.url
+        with self.assertRaises(OSError):
+            HTTPClient(scheduler=scheduler).get(url + '/rpc')
+
+    def test_rate(self):
+        scheduler = RequestScheduler(rate=20, burst=1)
+        http_client = HTTPClient(scheduler=scheduler)
+        with ScriptedServer([(200, b'')]) as server:
+            start = time.monotonic()
+            for _ in range(6):
+                http_client.get(server.url + '/rpc')
+            elapsed = time.monotonic() - start
+        # the first request uses the burst, the others wait for a token each
+        self.assertGreaterEqual(elapsed, 5 / 20 * 0.9)
+
+    def test_max_concurrency(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def serve_slowly(path, params, headers):
+            with lock:
+                active[0] += 1
+                active[1] = max(active[1], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return 200, b''
+
+        http_client = HTTPClient(scheduler=RequestScheduler(max_concurrency=3))
+        with LocalServer(serve_slowly) as server:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(lambda i: http_client.get('%s/%i' % (server.url, i)),
+                                  range(24)))
+        self.assertEqual(active[1], 3)
+
+
+class HostLimiterTest(unittest.TestCase):
+
+    def test_adaptive_limit(self):
+        limiter = HostLimiter(8)
+        self.assertEqual(limiter.limit, 8)
+        for limit in (4, 2, 1, 1):
+            limiter.acquire()
+            limiter.release(throttled=True)
+            self.assertEqual(limiter.limit, limit)
+        # additive increase, about one per limit successful requests
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(int(limiter.limit), 2)
+        for _ in range(100):
+            limiter.acquire()
+            limiter.release()
+        self.assertEqual(limiter.limit, 8)
+
+    def test_throttling_reduces_concurrency(self):
+        limiter = HostLimiter(4)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        limiter.acquire()
+        limiter.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_block(self):
+        limiter = HostLimiter(4)
+        limiter.block(0.2)
+        start = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+
+class RetryAfterTest(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(_parse_retry_after('120'), 120.0)
+        self.assertEqual(_parse_retry_after('-5'), 0.0)
+
+    def test_http_date(self):
+        delay = _parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True))
+        self.assertAlmostEqual(delay, 60, delta=2)
+
+    def test_invalid(self):
+        self.assertIsNone(_parse_retry_after(None))
+        self.assertIsNone(_parse_retry_after('soon'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+# Copyright © 2020 Felix Exner
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 1. Redistributions of source code must retain the above copyright
+# notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+# notice, this list of conditions and the following disclaimer in the
+# documentation and/or other materials provided with the distribution.
+# 3. Neither the name of the organization nor the
+# names of its contributors may be used to endorse or promote products
+# derived from this software without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY Felix Exner ''AS IS'' AND ANY
+# EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL Felix Exner BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import json
+import threading
+import unittest
+import unittest.mock
+
+from helpers.aur import AURAdapter
+from helpers.filters import PackageFilter
+from helpers.github import GHAdapter
+from helpers.http import FetchError, HTTPClient
+from helpers.pacman import PacmanDB
+from helpers.server import StatusServer, StatusService
+from tests.local_server import LocalServer
+
+# rosdistro version, AUR version and Github version of the packages of each distribution
+DISTROS = {
+    'noetic': {'roscpp': ('1.15.8', '1.15.8-1', '1.15.8'),
+               'rospy': ('1.15.9', '1.15.8-1', '1.15.8'),
+               'catkin': ('0.8.9', None, None),
+               'rviz': ('1.14.4', '1.14.4-1', '1.14.5')},
+    'melodic': {'roscpp': ('1.14.13', '1.14.12-1', '1.14.12')},
+}
+
+
+def serve_sources(path, params, headers):
+    """Stand-in for AURweb and the Github repositories of all distributions"""
+    aur_versions = dict()
+    gh_versions = dict()
+    for distro_name, packages in DISTROS.items():
+        for pkg_name, (_, aur_version, gh_version) in packages.items():
+            aur_pkg_name = 'ros-%s-%s' % (distro_name, pkg_name)
+            aur_versions[aur_pkg_name] = aur_version
+            gh_versions['/%s/master/PKGBUILD' % aur_pkg_name] = gh_version
+    if path == '/rpc':
+        results = [{'Name': name, 'Version': aur_versions[name], 'Maintainer': 'someone'}
+                   for name in params.get('arg[]', list()) if aur_versions.get(name)]
+        return 200, json.dumps({'type': 'multiinfo', 'resultcount': len(results),
+                                'results': results}).encode('utf-8')
+    if gh_versions.get(path):
+        return 200, ("pkgver=%s\n" % gh_versions[path]).encode('utf-8')
+    return 404, b''
+
+
+class StatusServerTest(unittest.TestCase):
+
+    def setUp(self):
+        sources = LocalServer(serve_sources).__enter__()
+        self.addCleanup(sources.__exit__)
+        patcher = unittest.mock.patch.object(AURAdapter, 'aur_api_url', sources.url + '/rpc?v=5')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        http_client = HTTPClient()
+        self.aur_error = None
+
+        def load_aur(aur_pkg_names):
+            if self.aur_error:
+                raise self.aur_error
+            return AURAdapter(list(DISTROS), http_client, aur_pkg_names)
+
+        self.service = StatusService(
+            list(DISTROS),
+            loaders={'installed': lambda: PacmanDB(packages={'ros-noetic-rospy': '1.15.8-1'}),
+                     'rosdistro': lambda: {
+                         distro_name: (list(packages), {pkg_name: versions[0] for pkg_name,
+                                                        versions in packages.items()}, None)
+                         for distro_name, packages in DISTROS.items()},
+                     'aur': load_aur,
+                     'github': lambda distro_name, aur_pkg_names: GHAdapter(
+                         distro_name, http_client, sources.url)},
+            intervals=dict(), pkg_filter=PackageFilter(), jobs=2)
+        self.service.refresh()
+
+        self.server = StatusServer(('127.0.0.1', 0), self.service)
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = 'http://127.0.0.1:%i' % self.server.server_address[1]
+        self.http_client = HTTPClient()
+
+    def get(self, path, headers=None):
+        response = self.http_client.get(self.url + path, headers)
+        return response.status, json.loads(response.body) if response.body else None
+
+    def get_names(self, path):
+        status, document = self.get(path)
+        self.assertEqual(status, 200)
+        return sorted((entry['distro'], entry['name']) for entry in document['packages'])
+
+    def test_categories(self):
+        self.assertEqual(self.get_names('/outdated'), [('melodic', 'roscpp'), ('noetic', 'rospy')])
+        self.assertEqual(self.get_names('/missing'), [('noetic', 'catkin')])
+        self.assertEqual(self.get_names('/outofsync'), [('noetic', 'rviz')])
+        self.assertEqual(self.get_names('/outdated?distro=noetic'), [('noetic', 'rospy')])
+        self.assertEqual(len(self.get_names('/packages')), 5)
+
+    def test_package(self):
+        status, document = self.get('/package/roscpp?distro=melodic')
+        self.assertEqual(status, 200)
+        self.assertEqual(len(document['packages']), 1)
+        entry = document['packages'][0]
+        self.assertEqual(entry['aur_name'], 'ros-melodic-roscpp')
+        self.assertEqual(entry['categories'], ['outdated'])
+        self.assertEqual(self.get_names('/package/ros-noetic-rospy'), [('noetic', 'rospy')])
+        self.assertEqual(self.get('/package/unknown')[0], 404)
+
+    def test_errors(self):
+        status, document = self.get('/outdated?distro=noetic,kinetic')
+        self.assertEqual(status, 400)
+        self.assertIn('kinetic', document['error'])
+        self.assertEqual(self.get('/unknown/path')[0], 404)
+
+    def test_etag(self):
+        response = self.http_client.get(self.url + '/outdated')
+        etag = response.headers.get('ETag')
+        self.assertTrue(etag)
+        response = self.http_client.get(self.url + '/outdated', {'If-None-Match': etag})
+        self.assertEqual(response.status, 304)
+        self.assertEqual(response.body, b'')
+        # the ETag changes with the content
+        response = self.http_client.get(self.url + '/missing', {'If-None-Match': etag})
+        self.assertEqual(response.status, 200)
+
+    def test_failing_refresh(self):
+        _, status = self.get('/status')
+        self.assertIsNone(status['sources']['aur']['error'])
+        self.assertEqual(status['counts']['noetic']['outdated'], 1)
+
+        for error in (FetchError('AURweb is down'), KeyError('results')):
+            self.aur_error = error
+            self.service.refresh(['aur'])
+            _, status = self.get('/status')
+            self.assertIn(str(error), status['sources']['aur']['error'])
+            # the previous data is still served
+            self.assertEqual(self.get_names('/outdated?distro=noetic'), [('noetic', 'rospy')])
+
+        self.aur_error = None
+        self.service.refresh(['aur'])
+        _, status = self.get('/status')
+        self.assertIsNone(status['sources']['aur']['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()